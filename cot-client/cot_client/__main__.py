@@ -1,4 +1,3 @@
-import json
 import logging
 from argparse import ArgumentParser
 from os import getenv
@@ -7,6 +6,7 @@ from rich import progress
 from rich.logging import RichHandler
 
 from cot_client.downloader import historical_cot_report, latest_cot_report
+from cot_client.producer import add_producer_arguments, create_producer
 
 
 def parse_args():
@@ -29,12 +29,12 @@ def parse_args():
         help="Specify the kafka topic stream to.",
         default="events",
     )
+    add_producer_arguments(parser)
 
     return parser.parse_args()
 
 
 def main():
-    from kafka import KafkaProducer
     from kafka.admin import KafkaAdminClient, NewTopic
 
     logger = logging.getLogger("cot-client-cli")
@@ -51,26 +51,16 @@ def main():
     for topic in topics:
         if topic not in existing_topics:
             admin_client.create_topics(
-                [NewTopic(topic, num_partitions=1, replication_factor=1)]
+                [
+                    NewTopic(
+                        topic,
+                        num_partitions=args.kafka_partitions,
+                        replication_factor=1,
+                    )
+                ]
             )
 
-    producer = KafkaProducer(
-        bootstrap_servers=args.kafka_bootstrap_servers,
-        value_serializer=lambda m: json.dumps(m).encode("utf8"),
-    )
-
-    def on_success(metadata):
-        logger.info(
-            f"Message produced to topic '{metadata.topic}'  at offset {metadata.offset}"
-        )
-
-    def on_error(e):
-        logger.error(f"Error sending message: {e}")
-
-    def send_event(event):
-        future = producer.send(args.kafka_topic, value=event._asdict())
-        future.add_callback(on_success)
-        future.add_errback(on_error)
+    producer = create_producer(args, logger)
 
     with progress.Progress(
         "[progress.description]{task.description}",
@@ -88,10 +78,13 @@ def main():
             events = latest_cot_report
 
         for event in events():
-            send_event(event)
+            producer.send(event._asdict(), key=str(event.cftc_commodity_code))
             pgs.advance(process_stocks_task)
 
+    producer.close()
+
 
 if __name__ == "__main__":
-    logging.basicConfig(handlers=[RichHandler()], level=logging.ERROR)
+    logging.basicConfig(handlers=[RichHandler()], level=logging.INFO)
+    logging.getLogger("kafka").setLevel(logging.WARNING)
     main()
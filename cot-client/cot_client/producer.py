@@ -0,0 +1,115 @@
+"""Kafka producer configured for throughput."""
+import logging
+from argparse import ArgumentParser, Namespace
+from functools import partial
+from time import monotonic
+from typing import Any, Mapping, Set
+
+from cot_client.codec import ENCODINGS, encode
+
+COMPRESSION_TYPES = ["none", "gzip", "lz4", "zstd"]
+
+
+def add_producer_arguments(parser: ArgumentParser):
+    """Adds the producer's tuning options to the CLI."""
+    parser.add_argument(
+        "--kafka_linger_ms",
+        type=int,
+        help="Specify how long the producer waits to fill a batch.",
+        default=50,
+    )
+    parser.add_argument(
+        "--kafka_batch_size",
+        type=int,
+        help="Specify the max size of a batch per partition in bytes.",
+        default=256 * 1024,
+    )
+    parser.add_argument(
+        "--kafka_compression_type",
+        choices=COMPRESSION_TYPES,
+        help="Specify the compression of the batches.",
+        default="lz4",
+    )
+    parser.add_argument(
+        "--kafka_acks",
+        choices=["0", "1", "all"],
+        help="Specify the number of acknowledgments the producer waits for.",
+        default="1",
+    )
+    parser.add_argument(
+        "--kafka_encoding",
+        choices=ENCODINGS,
+        help="Specify the encoding of the messages.",
+        default="binary",
+    )
+    parser.add_argument(
+        "--kafka_partitions",
+        type=int,
+        help="Specify the number of partitions of the topic when it is created.",
+        default=4,
+    )
+
+
+class EventProducer:
+    """Sends events to the topic and keeps the delivery stats."""
+
+    def __init__(self, producer: Any, topic: str, logger: logging.Logger):
+        self.producer = producer
+        self.topic = topic
+        self.logger = logger
+
+        self.sent = 0
+        self.failed = 0
+        # Keys of the events that were not delivered.
+        self.failed_keys: Set[str | None] = set()
+        self.started_at = monotonic()
+
+    def _on_error(self, key: str | None, e: Exception):
+        self.failed += 1
+        self.failed_keys.add(key)
+        self.logger.error(f"Error sending message: {e}")
+
+    def send(self, value: Mapping[str, Any], key: str | None = None):
+        """Sends the event, events with the same key land in the same partition."""
+        future = self.producer.send(
+            self.topic,
+            value=value,
+            key=key.encode("utf-8") if key is not None else None,
+        )
+        future.add_errback(partial(self._on_error, key))
+        self.sent += 1
+
+    def flush(self, timeout: float | None = None):
+        """Waits until all the buffered events are delivered and logs the stats."""
+        self.producer.flush(timeout=timeout)
+
+        elapsed = monotonic() - self.started_at
+        self.logger.info(
+            f"Delivered {self.sent - self.failed} of {self.sent} events "
+            f"to '{self.topic}' in {elapsed:.1f}s "
+            f"({self.sent / max(elapsed, 1e-9):,.0f} events/s)"
+        )
+        if self.failed:
+            self.logger.error(f"Failed to deliver {self.failed} events")
+
+    def close(self):
+        self.flush()
+        self.producer.close()
+
+
+def create_producer(args: Namespace, logger: logging.Logger) -> EventProducer:
+    from kafka import KafkaProducer
+
+    producer = KafkaProducer(
+        bootstrap_servers=args.kafka_bootstrap_servers,
+        value_serializer=lambda m: encode(m, args.kafka_encoding),
+        linger_ms=args.kafka_linger_ms,
+        batch_size=args.kafka_batch_size,
+        compression_type=(
+            None
+            if args.kafka_compression_type == "none"
+            else args.kafka_compression_type
+        ),
+        acks=args.kafka_acks if args.kafka_acks == "all" else int(args.kafka_acks),
+    )
+    return EventProducer(producer, topic=args.kafka_topic, logger=logger)
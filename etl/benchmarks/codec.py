@@ -0,0 +1,54 @@
+"""Compares the JSON and the binary encodings of the features messages.
+
+Usage:
+    python benchmarks/codec.py [--messages 100000]
+"""
+from argparse import ArgumentParser
+from random import Random
+from time import perf_counter
+
+from etl.codec import SCHEMAS, decode, encode
+
+
+def synthetic_features(n: int):
+    rng = Random(0)
+    for i in range(n):
+        payload = {field: rng.uniform(-100.0, 1000.0) for field in SCHEMAS[2]}
+        payload.update(
+            {
+                "symbol": f"SYM{i % 500}",
+                "date": "2023-10-20T00:00:00-04:00",
+                "volume": float(rng.randrange(10_000_000)),
+                "kind": "TICKER_PRICE",
+            }
+        )
+        yield payload
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--messages", type=int, default=100_000)
+    args = parser.parse_args()
+
+    payloads = list(synthetic_features(args.messages))
+
+    for encoding in ["json", "binary"]:
+        start = perf_counter()
+        messages = [encode(payload, encoding) for payload in payloads]
+        encode_time = perf_counter() - start
+
+        start = perf_counter()
+        for message in messages:
+            decode(message)
+        decode_time = perf_counter() - start
+
+        size = sum(len(message) for message in messages) / len(messages)
+        print(
+            f"{encoding:>6}: {size:6.1f} bytes/message, "
+            f"encode {len(messages) / encode_time:10,.0f} msg/s, "
+            f"decode {len(messages) / decode_time:10,.0f} msg/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
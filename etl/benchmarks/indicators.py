@@ -0,0 +1,56 @@
+"""Compares the streaming and the vectorized calculation of the indicators.
+
+Usage:
+    python benchmarks/indicators.py [--bars 10000]
+"""
+import copy
+from argparse import ArgumentParser
+from random import Random
+from time import perf_counter
+
+from etl.features import fused_indicators
+
+
+def synthetic_bars(n: int):
+    rng = Random(0)
+    close = 100.0
+    for day in range(n):
+        close = max(1.0, close + rng.gauss(0.0, 1.0))
+        yield {
+            "symbol": "SYM",
+            "date": day,
+            "open": close,
+            "high": close + rng.random(),
+            "low": close - rng.random(),
+            "close": close,
+            "volume": float(rng.randrange(1_000, 100_000)),
+        }
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--bars", type=int, default=10_000)
+    args = parser.parse_args()
+
+    bars = list(synthetic_bars(args.bars))
+
+    indicators = fused_indicators()
+    state = indicators.builder()
+    events = copy.deepcopy(bars)
+    started_at = perf_counter()
+    for event in events:
+        state, _ = indicators.mapper(state, event)
+    streaming = perf_counter() - started_at
+
+    indicators = fused_indicators()
+    events = copy.deepcopy(bars)
+    started_at = perf_counter()
+    indicators.batch_mapper(indicators.builder(), events)
+    vectorized = perf_counter() - started_at
+
+    print(f"streaming:  {streaming:.3f}s ({args.bars / streaming:,.0f} bars/s)")
+    print(f"vectorized: {vectorized:.3f}s ({args.bars / vectorized:,.0f} bars/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Compares the monitor's rule evaluation before and after `etl.rules.evaluate`.
+
+The features topic is replayed from synthetic bars: the events are
+calculated by the indicators and encoded like the features flow does.
+
+Usage:
+    python benchmarks/rules.py [--symbols 20] [--bars 2500]
+"""
+from argparse import ArgumentParser
+from time import perf_counter
+
+from etl.codec import decode, encode
+from etl.features import fused_indicators
+from etl.rules import (
+    Action,
+    adx_rule,
+    coppock_curve_rule,
+    evaluate,
+    macd_rule,
+    mfi_rule,
+    rsi_rule,
+    swing_low_rule,
+)
+# The directory of the script is on the path when it is run directly.
+from indicators import synthetic_bars
+
+
+def replay(symbols: int, bars: int):
+    messages = []
+    for i in range(symbols):
+        indicators = fused_indicators()
+        state = indicators.builder()
+        for event in synthetic_bars(bars):
+            event["symbol"] = f"S{i:03d}"
+            event["kind"] = "TICKER_PRICE"
+            event["dividends"] = 0.0
+            state, event = indicators.mapper(state, event)
+            messages.append(encode(event))
+    return messages
+
+
+def is_actionable(symbol, action, portfolio):
+    if symbol in portfolio:
+        return action == Action.SELL
+    return action == Action.BUY
+
+
+def all_decisions(payload):
+    symbol = payload["symbol"]
+    return [
+        macd_rule(symbol, payload["close"], payload["macd"], payload["macd_signal"]),
+        adx_rule(
+            symbol, payload["close"], payload["pdi"], payload["ndi"], payload["adx"]
+        ),
+        rsi_rule(symbol, payload["close"], payload["rsi"]),
+        mfi_rule(
+            symbol,
+            current_price=payload["close"],
+            pct_change=payload["pct_change"],
+            mfi_value=payload["money_flow_index"],
+            mfi_delta=payload["mfi_delta"],
+        ),
+        swing_low_rule(
+            symbol, current_price=payload["close"], swing_low=payload["swing_low"]
+        ),
+        coppock_curve_rule(
+            symbol,
+            current_price=payload["close"],
+            coppock_curve=payload["coppock_curve"],
+        ),
+    ]
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=20)
+    parser.add_argument("--bars", type=int, default=2500)
+    args = parser.parse_args()
+
+    messages = replay(args.symbols, args.bars)
+    payloads = [decode(m) for m in messages]
+    # Half of the tickers are held.
+    portfolio = {f"S{i:03d}" for i in range(0, args.symbols, 2)}
+
+    started_at = perf_counter()
+    before = [
+        d
+        for payload in payloads
+        for d in all_decisions(payload)
+        if is_actionable(d.ticker, d.action, portfolio)
+    ]
+    eager = perf_counter() - started_at
+
+    started_at = perf_counter()
+    after = [
+        s.decision()
+        for payload in payloads
+        for s in evaluate(payload)
+        if is_actionable(s.ticker, s.action, portfolio)
+    ]
+    lazy = perf_counter() - started_at
+
+    assert before == after
+    n = len(payloads)
+    print(f"events: {n:,}, decisions: {len(after):,}")
+    print(f"eager decisions: {eager:.3f}s ({n / eager:,.0f} events/s)")
+    print(f"lazy decisions:  {lazy:.3f}s ({n / lazy:,.0f} events/s)")
+
+
+if __name__ == "__main__":
+    main()
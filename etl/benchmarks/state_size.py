@@ -0,0 +1,58 @@
+"""Measures the memory and the snapshot size of the indicators' state.
+
+Usage:
+    python benchmarks/state_size.py [--symbols 10000] [--bars 30]
+"""
+import gc
+import pickle
+import tracemalloc
+from argparse import ArgumentParser
+from random import Random
+
+from etl.features import fused_indicators
+
+
+def synthetic_events(symbols: int, bars: int):
+    rng = Random(0)
+    for day in range(bars):
+        for i in range(symbols):
+            close = rng.uniform(10.0, 100.0)
+            yield {
+                "symbol": f"SYM{i}",
+                "date": day,
+                "open": close,
+                "high": close + rng.random(),
+                "low": close - rng.random(),
+                "close": close,
+                "volume": float(rng.randrange(1_000, 100_000)),
+                "dividends": 0.0,
+                "kind": "TICKER_PRICE",
+            }
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=10_000)
+    parser.add_argument("--bars", type=int, default=30)
+    args = parser.parse_args()
+
+    indicators = fused_indicators()
+
+    tracemalloc.start()
+    states = {}
+    for event in synthetic_events(args.symbols, args.bars):
+        states[event["symbol"]], _ = indicators.mapper(
+            states.get(event["symbol"]), event
+        )
+    gc.collect()
+    resident, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    snapshot = sum(len(pickle.dumps(state)) for state in states.values())
+
+    print(f"resident: {resident / args.symbols:,.0f} B/symbol")
+    print(f"snapshot: {snapshot / args.symbols:,.0f} B/symbol")
+
+
+if __name__ == "__main__":
+    main()
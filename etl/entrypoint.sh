@@ -4,8 +4,11 @@ set -ex;
 
 mkdir -p ${RECOVERY_DIR}
 
+# A fresh recovery store loses the indicators' state, set WARM_START to
+# rebuild it from the history table instead of replaying all the events.
 if [ -z "$(ls -A $RECOVERY_DIR)" ]; then
-  ./.venv/bin/python -m bytewax.recovery ${RECOVERY_DIR} 1
+  ./.venv/bin/python -m bytewax.recovery ${RECOVERY_DIR} ${RECOVERY_PARTITIONS:-1}
 fi
 
+# Scale with BYTEWAX_PROCESSES and BYTEWAX_WORKERS_PER_PROCESS, both read by bytewax.run.
 ./.venv/bin/python -m bytewax.run -r ${RECOVERY_DIR} ${BYTEWAX_FLOW}
\ No newline at end of file
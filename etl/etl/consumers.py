@@ -1,119 +1,314 @@
 from datetime import timedelta
-import json
+import math
 import os
 import psycopg
 import logging
 
-from typing import Any, Iterable, Mapping, Tuple
+from typing import Any, Iterable, List, Mapping, Sequence, Tuple
 
 from bytewax.connectors.kafka import KafkaInput
 from bytewax.dataflow import Dataflow
 from bytewax.outputs import DynamicOutput, StatelessSink
 
+from etl.codec import decode
+from etl.db import acquire_pool, release_pool, with_retries
+from etl.lake import write_partitions
+from etl.registry import DEFAULT_INDICATORS, history_fields, parse_indicators
+from etl.rollups import ROLLUPS, create_rollups, refresh_rollups
+from etl.sql import (
+    WRITE_MODES,
+    Column,
+    dedupe_table,
+    lock_table_schema,
+    set_column_types,
+    TableRows,
+    to_date,
+    write_tables,
+)
+
+HISTORY_KEY = ("symbol", "date")
+LATEST_FEATURES_KEY = ("symbol",)
+
+# `real` rounds the features to 5 decimals and stores them as REAL (~7
+# significant digits), `double` stores them as they are.
+STORAGES = ["real", "double"]
+# Fields stored as BIGINT by the `double` storage.
+INTEGER_FIELDS = ("volume",)
+
+
+def feature_columns(features: Sequence[str], storage: str = "real") -> List[Column]:
+    """Returns the names and the Postgres types of the features' columns."""
+    match storage:
+        case "real":
+            return [(f, "real") for f in features]
+        case "double":
+            return [
+                (f, "bigint" if f in INTEGER_FIELDS else "double precision")
+                for f in features
+            ]
+        case _:
+            raise ValueError(f"Unknown storage {storage}")
+
+
+def history_rows(
+    items: Iterable[Tuple[str, Sequence[Mapping[str, Any]]]],
+    features: Sequence[str],
+    storage: str = "real",
+) -> List[Tuple[Any, ...]]:
+    """Returns the rows of the history table of the batches of events."""
+    rows = []
+    if storage == "double":
+        integers = [i for i, f in enumerate(features) if f in INTEGER_FIELDS]
+        for _, batch in items:
+            for item in batch:
+                values = [item[f] for f in features]
+                for i in integers:
+                    # Yahoo's partial bars may miss the volume.
+                    v = values[i]
+                    values[i] = int(v) if v is not None and math.isfinite(v) else None
+                rows.append((item["symbol"], to_date(item["date"]), *values))
+        return rows
+
+    for _, batch in items:
+        for item in batch:
+            rows.append(
+                (
+                    item["symbol"],
+                    to_date(item["date"]),
+                    *(
+                        round(item[f], 5) if item[f] is not None else None
+                        for f in features
+                    ),
+                )
+            )
+    return rows
+
+
+def latest_rows(rows: Sequence[Tuple[Any, ...]]) -> List[Tuple[Any, ...]]:
+    """Returns the row with the latest date of every symbol of the history rows."""
+    latest = {}
+    for row in rows:
+        symbol, date = row[0], row[1]
+        if date is None:
+            continue
+        if symbol not in latest or latest[symbol][1] <= date:
+            latest[symbol] = row
+    return list(latest.values())
+
 
 class SQLSink(StatelessSink):
-    def __init__(self, conn_info: str, worker_index: int):
+    def __init__(
+        self,
+        conn_info: str,
+        worker_index: int,
+        features: Sequence[str],
+        write_mode: str = "copy",
+        partition_by_year: bool = False,
+        storage: str = "real",
+        parquet_dir: str | None = None,
+    ):
         super().__init__()
 
         self.logger = logging.getLogger(f"etl.consumers.{worker_index}")
 
-        self.connection = psycopg.connect(conn_info)
-
-        self.features = [
-            "open",
-            "high",
-            "low",
-            "close",
-            "volume",
-            "pdi",
-            "ndi",
-            "adx",
-            "macd",
-            "macd_signal",
-            "rsi",
-            "dividends",
-            "moving_average_50",
-            "moving_average_200",
-            "money_flow_index",
-            "swing_low",
-            "coppock_curve",
-        ]
+        self.conn_info = conn_info
+        self.pool = acquire_pool(conn_info)
+
+        self.features = list(features)
+        self.write_mode = write_mode
+        self.partition_by_year = partition_by_year
+        self.storage = storage
+        self.columns = [("symbol", "varchar"), ("date", "date")] + feature_columns(
+            self.features, storage
+        )
+        # Optional Parquet copy of the history, see etl.lake.
+        self.parquet_dir = parquet_dir
+        # Years with a partition, when the table is partitioned.
+        self.partitions = set()
 
         self.prepare_tables()
 
     def prepare_tables(self):
-        features_schema = ",".join([f"{f} REAL" for f in self.features])
-        with self.connection.cursor() as cursor:
+        with_retries(self.pool, self._prepare_tables, self.logger)
+
+    def _prepare_tables(self, connection: psycopg.Connection):
+        columns = self.columns[2:]
+        features_schema = ",".join([f"{f} {type_}" for f, type_ in columns])
+        with connection.cursor() as cursor:
+            lock_table_schema(cursor, "history")
+            cursor.execute("SELECT to_regclass('history')")
+            exists = cursor.fetchone()[0] is not None
+
+            if self.partition_by_year and not exists:
+                # The primary key of a partitioned table must include the
+                # partition key, the unique (symbol, date) index is enough.
+                cursor.execute(
+                    f"""CREATE TABLE history (
+                        record_id SERIAL,
+                        symbol VARCHAR(12) NOT NULL,
+                        date DATE NOT NULL,
+                        {features_schema})
+                    PARTITION BY RANGE (date)
+                    """
+                )
+            else:
+                cursor.execute(
+                    f"""CREATE TABLE IF NOT EXISTS history (
+                        record_id SERIAL PRIMARY KEY,
+                        symbol VARCHAR(12) NOT NULL,
+                        date DATE,
+                        {features_schema})
+                    """
+                )
+            # Columns of the indicators added to the feature set later.
+            for f, type_ in columns:
+                cursor.execute(
+                    f"ALTER TABLE history ADD COLUMN IF NOT EXISTS {f} {type_}"
+                )
+            dedupe_table(cursor, "history", HISTORY_KEY, "history_symbol_date_key")
+            # The latest bars of the symbols, see the frontend's queries.
+            cursor.execute(
+                """CREATE INDEX IF NOT EXISTS history_symbol_date_desc
+                ON history (symbol, date DESC)"""
+            )
+
+            cursor.execute(
+                """SELECT count(*) FROM pg_partitioned_table
+                WHERE partrelid = 'history'::regclass"""
+            )
+            self.partitioned = cursor.fetchone()[0] > 0
+            if self.partition_by_year and not self.partitioned:
+                self.logger.warning(
+                    "Table history exists and isn't partitioned, "
+                    "partitioning applies only to a new table."
+                )
+
+            # The latest bar of every symbol, kept in sync with history.
+            cursor.execute("SELECT to_regclass('latest_features')")
+            latest_exists = cursor.fetchone()[0] is not None
             cursor.execute(
-                f"""CREATE TABLE IF NOT EXISTS history (
-                    record_id SERIAL PRIMARY KEY,
-                    symbol VARCHAR(12) NOT NULL,
+                f"""CREATE TABLE IF NOT EXISTS latest_features (
+                    symbol VARCHAR(12) PRIMARY KEY,
                     date DATE,
                     {features_schema})
                 """
             )
-            self.connection.commit()
-        self.logger.info("Table history is created.")
+            for f, type_ in columns:
+                cursor.execute(
+                    f"ALTER TABLE latest_features ADD COLUMN IF NOT EXISTS {f} {type_}"
+                )
+            if not latest_exists:
+                names = ", ".join(["symbol", "date"] + self.features)
+                cursor.execute(
+                    f"""INSERT INTO latest_features ({names})
+                    SELECT DISTINCT ON (symbol) {names} FROM history
+                    WHERE date IS NOT NULL
+                    ORDER BY symbol, date DESC"""
+                )
+
+            create_rollups(cursor, columns)
+
+            # REAL columns of the existing tables are widened, never narrowed.
+            if self.storage == "double":
+                for table in ["history", "latest_features", *ROLLUPS.values()]:
+                    set_column_types(cursor, table, columns)
+            connection.commit()
+        self.logger.info("Tables history, latest_features and rollups are created.")
+
+    def prepare_partitions(
+        self, connection: psycopg.Connection, rows: Sequence[Tuple[Any, ...]]
+    ):
+        """Creates the yearly partitions of the rows missing them."""
+        years = {row[1].year for row in rows} - self.partitions
+        if not years:
+            return
+
+        with connection.cursor() as cursor:
+            lock_table_schema(cursor, "history")
+            for year in sorted(years):
+                cursor.execute(
+                    f"""CREATE TABLE IF NOT EXISTS history_{year}
+                    PARTITION OF history
+                    FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"""
+                )
+            connection.commit()
+        self.partitions.update(years)
 
     def close(self):
-        self.cursor.close()
-        self.connection.close()
+        release_pool(self.conn_info)
 
     def write_batch(self, items: Iterable[Tuple[str, Mapping[str, Any]]]):
-        records = []
-        for key__payload in items:
-            _, batch = key__payload
-            for item in batch:
-                records.append(
-                    {
-                        k: round(v, 5) if k in self.features else v
-                        for k, v in item.items()
-                    }
-                )
+        rows = history_rows(items, self.features, self.storage)
 
-        names = ",".join(self.features)
-        values = ",".join([f"%({f})s" for f in self.features])
-        with self.connection.cursor() as cursor:
-            try:
-                cursor.executemany(
-                    f"""INSERT INTO 
-                    history 
-                    (
-                        symbol, 
-                        date, 
-                        {names}
-                    )
-                   VALUES (
-                        %(symbol)s, 
-                        %(date)s, 
-                        {values}
-                    )
-                """,
-                    records,
-                )
-            except Exception as e:
-                self.logger.exception("Failed to insert %s", records)
+        # Upserts, so a batch interrupted by a lost connection can be retried.
+        with_retries(
+            self.pool, lambda c: self._write(c, self.columns, rows), self.logger
+        )
 
-                raise e from None
-            try:
-                self.connection.commit()
-            except Exception as e:
-                self.logger.exception("Failed to commit.")
+        if self.parquet_dir:
+            write_partitions(self.parquet_dir, self.columns, rows)
 
-                raise e from None
+    def _write(
+        self,
+        connection: psycopg.Connection,
+        columns: Sequence[Column],
+        rows: Sequence[Tuple[Any, ...]],
+    ):
+        if self.partitioned:
+            self.prepare_partitions(connection, rows)
+
+        write_tables(
+            connection,
+            self.write_mode,
+            [
+                TableRows("history", columns, rows, HISTORY_KEY),
+                # Replayed older bars don't overwrite the latest ones.
+                TableRows(
+                    "latest_features",
+                    columns,
+                    latest_rows(rows),
+                    LATEST_FEATURES_KEY,
+                    where="latest_features.date <= EXCLUDED.date",
+                ),
+            ],
+            self.logger,
+            after=lambda cursor: refresh_rollups(cursor, self.features, rows),
+        )
 
 
 class SQLOutput(DynamicOutput):
     def __init__(
-        self, db_host: str, db_user: str, db_name: str, db_password: str
+        self,
+        db_host: str,
+        db_user: str,
+        db_name: str,
+        db_password: str,
+        features: Sequence[str],
+        write_mode: str = "copy",
+        partition_by_year: bool = False,
+        storage: str = "real",
+        parquet_dir: str | None = None,
     ) -> None:
         super().__init__()
         self.conn_info = (
             f"postgresql://{db_user}:{db_password}@{db_host}:5432/{db_name}"
         )
+        self.features = features
+        self.write_mode = write_mode
+        self.partition_by_year = partition_by_year
+        self.storage = storage
+        self.parquet_dir = parquet_dir
 
     def build(self, worker_index: int, worker_count: int) -> SQLSink:
-        return SQLSink(self.conn_info, worker_index)
+        return SQLSink(
+            self.conn_info,
+            worker_index,
+            self.features,
+            self.write_mode,
+            self.partition_by_year,
+            self.storage,
+            self.parquet_dir,
+        )
 
 
 def sink_to_db():
@@ -123,6 +318,17 @@ def sink_to_db():
     DB_PASSWORD = os.getenv("POSTGRES_PASSWORD")
     BOOTSTRAP_SERVERS = os.getenv("BOOTSTRAP_SERVERS", "localhost:19092").split(",")
     KAFKA_INPUT_TOPICS = os.getenv("KAFKA_INPUT_TOPICS", "features").split(",")
+    INDICATORS = os.getenv("INDICATORS") or DEFAULT_INDICATORS
+    SINK_WRITE_MODE = os.getenv("SINK_WRITE_MODE", "copy")
+    # Applies only when the history table is created.
+    HISTORY_PARTITION_BY_YEAR = os.getenv("HISTORY_PARTITION_BY_YEAR", "0") == "1"
+    HISTORY_STORAGE = os.getenv("HISTORY_STORAGE", "real")
+    # Set to also export the history to Parquet files.
+    HISTORY_PARQUET_DIR = os.getenv("HISTORY_PARQUET_DIR") or None
+    if SINK_WRITE_MODE not in WRITE_MODES:
+        raise ValueError(f"Unknown SINK_WRITE_MODE {SINK_WRITE_MODE}")
+    if HISTORY_STORAGE not in STORAGES:
+        raise ValueError(f"Unknown HISTORY_STORAGE {HISTORY_STORAGE}")
 
     flow = Dataflow()
     flow.input(
@@ -136,11 +342,24 @@ def sink_to_db():
     def deserialize(key__payload):
         key, payload = key__payload
 
-        return key.decode("utf8"), json.loads(payload)
+        return key.decode("utf8"), decode(payload)
 
     flow.map(deserialize)
 
     flow.batch("prebatch", 1000, timedelta(seconds=60))
-    flow.output("sink_to_db", SQLOutput(DB_HOST, DB_USER, DB_NAME, DB_PASSWORD))
+    flow.output(
+        "sink_to_db",
+        SQLOutput(
+            DB_HOST,
+            DB_USER,
+            DB_NAME,
+            DB_PASSWORD,
+            features=history_fields(parse_indicators(INDICATORS)),
+            write_mode=SINK_WRITE_MODE,
+            partition_by_year=HISTORY_PARTITION_BY_YEAR,
+            storage=HISTORY_STORAGE,
+            parquet_dir=HISTORY_PARQUET_DIR,
+        ),
+    )
 
     return flow
@@ -1,22 +1,53 @@
 from datetime import timedelta
-import json
 import logging
 import os
 import psycopg
 
-from typing import Any, Iterable, Mapping, Tuple
+from typing import Any, Iterable, List, Mapping, Sequence, Tuple
 
 from bytewax.connectors.kafka import KafkaInput
 from bytewax.dataflow import Dataflow
 from bytewax.outputs import DynamicOutput, StatelessSink
 
+from etl.codec import decode
+from etl.db import acquire_pool, release_pool, with_retries
+from etl.sql import (
+    WRITE_MODES,
+    dedupe_table,
+    lock_table_schema,
+    to_date,
+    write_rows,
+)
+
+COT_HISTORY_KEY = ("cftc_commodity_code", "market_and_exchange_names", "report_date")
+
+
+def cot_history_rows(
+    items: Iterable[Tuple[str, Sequence[Mapping[str, Any]]]], features: Sequence[str]
+) -> List[Tuple[Any, ...]]:
+    """Returns the rows of the cot_history table of the batches of reports."""
+    rows = []
+    for _, batch in items:
+        for item in batch:
+            rows.append(
+                (
+                    item["market_and_exchange_names"],
+                    int(item["cftc_commodity_code"]),
+                    to_date(item["report_date"]),
+                    *(item[f] for f in features),
+                )
+            )
+    return rows
+
 
 class SQLSink(StatelessSink):
-    def __init__(self, conn_info: str, worker_index: int):
+    def __init__(self, conn_info: str, worker_index: int, write_mode: str = "copy"):
         super().__init__()
 
         self.logger = logging.getLogger(f"etl.cot_consumers.{worker_index}")
-        self.connection = psycopg.connect(conn_info)
+        self.write_mode = write_mode
+        self.conn_info = conn_info
+        self.pool = acquire_pool(conn_info)
 
         self.features = [
             "open_interest_all",
@@ -35,8 +66,12 @@ class SQLSink(StatelessSink):
         self.prepare_tables()
 
     def prepare_tables(self):
+        with_retries(self.pool, self._prepare_tables, self.logger)
+
+    def _prepare_tables(self, connection: psycopg.Connection):
         features_schema = ",".join([f"{f} REAL" for f in self.features])
-        with self.connection.cursor() as cursor:
+        with connection.cursor() as cursor:
+            lock_table_schema(cursor, "cot_history")
             cursor.execute(
                 f"""CREATE TABLE IF NOT EXISTS cot_history (
                     record_id SERIAL PRIMARY KEY,
@@ -46,61 +81,56 @@ class SQLSink(StatelessSink):
                     {features_schema})
                 """
             )
-            self.connection.commit()
+            dedupe_table(
+                cursor, "cot_history", COT_HISTORY_KEY, "cot_history_natural_key"
+            )
+            connection.commit()
         self.logger.info("Table cot_history is created.")
 
     def close(self):
-        self.cursor.close()
-        self.connection.close()
+        release_pool(self.conn_info)
 
     def write_batch(self, items: Iterable[Tuple[str, Mapping[str, Any]]]):
-        records = []
-        for key__payload in items:
-            _, batch = key__payload
-            records.extend(batch)
-
-        names = ",".join(self.features)
-        values = ",".join([f"%({f})s" for f in self.features])
-
-        with self.connection.cursor() as cursor:
-            try:
-                cursor.executemany(
-                    f"""INSERT INTO 
-                    cot_history 
-                    (
-                        market_and_exchange_names,
-                        cftc_commodity_code,
-                        report_date,
-                        {names}
-                    )
-                   VALUES (
-                        %(market_and_exchange_names)s, 
-                        %(cftc_commodity_code)s, 
-                        %(report_date)s, 
-                        {values}
-                    )
-                """,
-                    records,
-                )
-            except Exception as e:
-                self.logger.exception("Failed to insert %s", records)
-
-                raise e from None
-
-        self.connection.commit()
+        columns = [
+            ("market_and_exchange_names", "text"),
+            ("cftc_commodity_code", "integer"),
+            ("report_date", "date"),
+        ] + [(f, "real") for f in self.features]
+        rows = cot_history_rows(items, self.features)
+
+        # Upserts, so a batch interrupted by a lost connection can be retried.
+        with_retries(
+            self.pool,
+            lambda connection: write_rows(
+                connection,
+                self.write_mode,
+                "cot_history",
+                columns,
+                rows,
+                self.logger,
+                key=COT_HISTORY_KEY,
+            ),
+            self.logger,
+        )
 
 
 class SQLOutput(DynamicOutput):
     def __init__(
-        self, db_host: str, db_user: str, db_name: str, db_password: str
+        self,
+        db_host: str,
+        db_user: str,
+        db_name: str,
+        db_password: str,
+        write_mode: str = "copy",
     ) -> None:
         super().__init__()
         self.conn_info = (
             f"postgresql://{db_user}:{db_password}@{db_host}:5432/{db_name}"
         )
+        self.write_mode = write_mode
 
     def build(self, worker_index: int, worker_count: int) -> SQLSink:
-        return SQLSink(self.conn_info, worker_index)
+        return SQLSink(self.conn_info, worker_index, self.write_mode)
 
 
 def sink_to_db():
@@ -110,6 +140,9 @@ def sink_to_db():
     DB_PASSWORD = os.getenv("POSTGRES_PASSWORD")
     BOOTSTRAP_SERVERS = os.getenv("BOOTSTRAP_SERVERS", "localhost:19092").split(",")
     KAFKA_INPUT_TOPICS = os.getenv("KAFKA_INPUT_TOPICS", "events").split(",")
+    SINK_WRITE_MODE = os.getenv("SINK_WRITE_MODE", "copy")
+    if SINK_WRITE_MODE not in WRITE_MODES:
+        raise ValueError(f"Unknown SINK_WRITE_MODE {SINK_WRITE_MODE}")
 
     flow = Dataflow()
     flow.input(
@@ -123,11 +156,10 @@ def sink_to_db():
     def deserialize(key__payload):
         key, payload = key__payload
 
-        # For batch we need key
-        if key is None:
-            key = "ALL"
+        # For batch we need key, producers key events by CFTC code.
+        key = key.decode("utf8") if key is not None else "ALL"
 
-        return key, json.loads(payload)
+        return key, decode(payload)
 
     flow.map(deserialize)
 
@@ -138,6 +170,9 @@ def sink_to_db():
     flow.filter(is_cot_data)
 
     flow.batch("cot_prebatch", 1000, timedelta(seconds=60))
-    flow.output("cot_sink_to_db", SQLOutput(DB_HOST, DB_USER, DB_NAME, DB_PASSWORD))
+    flow.output(
+        "cot_sink_to_db",
+        SQLOutput(DB_HOST, DB_USER, DB_NAME, DB_PASSWORD, write_mode=SINK_WRITE_MODE),
+    )
 
     return flow
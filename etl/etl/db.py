@@ -0,0 +1,96 @@
+"""Pooled connections to Postgres shared by the steps of a flow.
+
+Steps of all the workers of a process share one pool per database. The
+pool checks a connection before lending it and reconnects in the
+background, so a restart of Postgres costs a few failed attempts instead
+of the flow.
+
+Work is retried on transient errors (lost connections, serialization
+failures, deadlocks) with a fresh connection. The work has to be
+idempotent, e.g. an upsert.
+"""
+import logging
+import time
+from threading import Lock
+from typing import Callable, Dict, Tuple, TypeVar
+
+import psycopg
+from psycopg_pool import ConnectionPool
+
+T = TypeVar("T")
+
+# Lost connections, shutdowns of the server, serialization failures and
+# deadlocks are all operational errors.
+TRANSIENT_ERRORS = (psycopg.OperationalError,)
+
+_lock = Lock()
+# Connection info to the pool and the number of its users.
+_pools: Dict[str, Tuple[ConnectionPool, int]] = {}
+
+
+def acquire_pool(conn_info: str, max_size: int = 4) -> ConnectionPool:
+    """Returns the pool of the database, opens it for the first user.
+
+    Args:
+      conn_info - the connection string of the database.
+      max_size - the max number of connections of a new pool.
+    """
+    with _lock:
+        pool, users = _pools.get(conn_info, (None, 0))
+        if pool is None:
+            pool = ConnectionPool(
+                conn_info,
+                min_size=1,
+                max_size=max_size,
+                check=ConnectionPool.check_connection,
+                open=True,
+            )
+        _pools[conn_info] = (pool, users + 1)
+        return pool
+
+
+def release_pool(conn_info: str):
+    """Closes the pool of the database when its last user releases it."""
+    with _lock:
+        pool, users = _pools.pop(conn_info, (None, 0))
+        if pool is None:
+            return
+        if users > 1:
+            _pools[conn_info] = (pool, users - 1)
+        else:
+            pool.close()
+
+
+def with_retries(
+    pool: ConnectionPool,
+    work: Callable[[psycopg.Connection], T],
+    logger: logging.Logger,
+    retries: int = 5,
+    backoff: float = 1.0,
+) -> T:
+    """Runs the work with a connection of the pool, retries transient errors.
+
+    Args:
+      pool - the pool to take the connections from.
+      work - the function using the connection, has to be idempotent.
+      logger - the logger of the caller.
+      retries - the max number of retries.
+      backoff - the delay before the first retry in seconds, doubled after.
+
+    Returns:
+      the result of the work.
+    """
+    delay = backoff
+    for attempt in range(retries + 1):
+        try:
+            with pool.connection() as connection:
+                return work(connection)
+        except TRANSIENT_ERRORS as e:
+            if attempt == retries:
+                raise
+            logger.warning(
+                f"Transient error, retrying in {delay:.1f}s "
+                f"({attempt + 1}/{retries}): {e}"
+            )
+            time.sleep(delay)
+            delay *= 2
@@ -1,26 +1,28 @@
 import os
+from datetime import timedelta
+from typing import Mapping
 
 from bytewax.connectors.kafka import KafkaInput, KafkaOutput
 from bytewax.dataflow import Dataflow
 
-from etl.math import (
-    MA,
-    MACD,
-    MFI,
-    RSI,
-    AverageDirectionalIndex,
-    AverageTrueRange,
-    CoppockCurve,
-    SwingLow,
-)
+from etl.codec import decode, encode
+from etl.math import Indicators, IndicatorsState
+from etl.registry import DEFAULT_INDICATORS, parse_indicators
+from etl.warm_start import load_seeds
 
 
-def prepare_output_topic(bootstrap_servers, kafka_output_topic):
+def prepare_output_topic(bootstrap_servers, kafka_output_topic, num_partitions=1):
     from confluent_kafka.admin import AdminClient, NewTopic
 
     admin_client = AdminClient({"bootstrap.servers": bootstrap_servers[0]})
     fs = admin_client.create_topics(
-        [NewTopic(kafka_output_topic, num_partitions=1, replication_factor=1)],
+        [
+            NewTopic(
+                kafka_output_topic,
+                num_partitions=num_partitions,
+                replication_factor=1,
+            )
+        ],
         validate_only=False,
     )
     for topic, f in fs.items():
@@ -31,6 +33,43 @@ def prepare_output_topic(bootstrap_servers, kafka_output_topic):
             print("Failed to create topic {}: {}".format(topic, e))
 
 
+def fused_indicators(
+    seeds: Mapping[str, IndicatorsState] | None = None,
+    config: str = DEFAULT_INDICATORS,
+) -> Indicators:
+    """Returns the indicators calculated by the flow.
+
+    Args:
+      seeds - the initial states of the symbols.
+      config - the feature set, see `etl.registry`.
+    """
+    return Indicators(parse_indicators(config), seeds=seeds)
+
+
+def indicators(
+    flow: Dataflow,
+    backfill_batch_size: int = 0,
+    seeds: Mapping[str, IndicatorsState] | None = None,
+    config: str = DEFAULT_INDICATORS,
+):
+    """Adds the step calculating the indicators of the events keyed by symbol.
+
+    Args:
+      flow - the flow of the events keyed by symbol.
+      backfill_batch_size - enables the backfill mode, when positive the
+        events of a symbol are calculated in batches of up to this size.
+      seeds - the initial states of the symbols, see `etl.warm_start`.
+      config - the feature set, see `etl.registry`.
+    """
+    fused = fused_indicators(seeds, config)
+    if backfill_batch_size > 0:
+        fused.backfill(
+            flow, batch_size=backfill_batch_size, timeout=timedelta(seconds=1)
+        )
+    else:
+        fused(flow)
+
+
 def calculate_features():
     import json
     from datetime import datetime, timezone
@@ -38,9 +77,30 @@ def calculate_features():
     BOOTSTRAP_SERVERS = os.getenv("BOOTSTRAP_SERVERS", "localhost:19092").split(",")
     KAFKA_INPUT_TOPICS = os.getenv("KAFKA_INPUT_TOPICS", "events").split(",")
     KAFKA_OUTPUT_TOPIC = os.getenv("KAFKA_OUTPUT_TOPIC", "features")
+    KAFKA_OUTPUT_ENCODING = os.getenv("KAFKA_OUTPUT_ENCODING", "binary")
+    KAFKA_OUTPUT_PARTITIONS = int(os.getenv("KAFKA_OUTPUT_PARTITIONS", "4"))
+    BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "0"))
+    INDICATORS = os.getenv("INDICATORS") or DEFAULT_INDICATORS
+    # Either `history` or the path to a snapshot, see etl.warm_start.
+    WARM_START = os.getenv("WARM_START", "")
+    DB_HOST = os.getenv("POSTGRES_HOST")
+    DB_USER = os.getenv("POSTGRES_USER")
+    DB_NAME = os.getenv("POSTGRES_DB")
+    DB_PASSWORD = os.getenv("POSTGRES_PASSWORD")
+
+    seeds = None
+    if WARM_START:
+        seeds = load_seeds(
+            WARM_START,
+            fused_indicators(config=INDICATORS),
+            conn_info=f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:5432/{DB_NAME}",
+        )
+        print(f"Warm start of {len(seeds)} symbols from {WARM_START}")
 
     prepare_output_topic(
-        bootstrap_servers=BOOTSTRAP_SERVERS, kafka_output_topic=KAFKA_OUTPUT_TOPIC
+        bootstrap_servers=BOOTSTRAP_SERVERS,
+        kafka_output_topic=KAFKA_OUTPUT_TOPIC,
+        num_partitions=KAFKA_OUTPUT_PARTITIONS,
     )
 
     flow = Dataflow()
@@ -54,7 +114,7 @@ def calculate_features():
 
     def deserialize(key__payload):
         key, payload = key__payload
-        return key, json.loads(payload)
+        return key, decode(payload)
 
     flow.map(deserialize)
 
@@ -64,6 +124,8 @@ def calculate_features():
 
     flow.filter(is_stock_data)
 
+    # Events are keyed by symbol, so the state of a symbol lives on one worker
+    # and the flow scales with the number of partitions of the input topic.
     def parse(key__payload):
         _, item_v = key__payload
         item_v["date"] = datetime.fromisoformat(item_v["date"]).astimezone(timezone.utc)
@@ -71,22 +133,19 @@ def calculate_features():
 
     flow.map(parse)
 
-    AverageTrueRange(p=14)(flow)
-    AverageDirectionalIndex(p=14)(flow)
-    MACD()(flow)
-    RSI()(flow)
-    MA(window=50)(flow)
-    MA(window=200)(flow)
-    MFI()(flow)
-    SwingLow()(flow)
-    CoppockCurve()(flow)
+    indicators(
+        flow,
+        backfill_batch_size=BACKFILL_BATCH_SIZE,
+        seeds=seeds,
+        config=INDICATORS,
+    )
 
     def serialize_with_key(key__payload):
         key, payload = key__payload
         new_key_bytes = key if key else json.dumps("unk_key").encode("utf-8")
         payload["date"] = payload["date"].isoformat()
 
-        return new_key_bytes, json.dumps(payload).encode("utf-8")
+        return new_key_bytes, encode(payload, KAFKA_OUTPUT_ENCODING)
 
     flow.map(serialize_with_key)
 
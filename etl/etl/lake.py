@@ -0,0 +1,229 @@
+"""Columnar export of the history, Parquet files partitioned by symbol and year.
+
+The files of a partition live in `root/symbol=AAPL/year=2023/`, every
+write adds a new file. Files are written under a temporary name and
+renamed, so readers never see a partial file. Names start with the time of
+the write, so the files of a partition sort in the order of the writes.
+
+Once a partition has too many files they are compacted into one, which
+keeps the name of the newest merged file. A bar written twice (e.g. a
+replayed event) is read from the newest file holding it.
+
+Files written before a change of the history's storage (`real` to
+`double`) keep their types, the reads widen them and the compaction casts
+the merged file to the current schema.
+"""
+import os
+import time
+import uuid
+from collections import defaultdict
+from datetime import date
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from etl.sql import Column
+
+# Postgres types of the history columns to the Arrow ones.
+ARROW_TYPES: Mapping[str, pa.DataType] = {
+    "varchar": pa.string(),
+    "text": pa.string(),
+    "date": pa.date32(),
+    "real": pa.float32(),
+    "double precision": pa.float64(),
+    "bigint": pa.int64(),
+}
+
+
+def arrow_schema(columns: Sequence[Column]) -> pa.Schema:
+    return pa.schema([(name, ARROW_TYPES[type_]) for name, type_ in columns])
+
+
+def partition_dir(root: str, symbol: str, year: int) -> str:
+    return os.path.join(root, f"symbol={symbol}", f"year={year}")
+
+
+def partition_files(directory: str) -> List[str]:
+    """Returns the paths of the files of the partition in the order of the writes."""
+    if not os.path.isdir(directory):
+        return []
+    return [
+        os.path.join(directory, name)
+        for name in sorted(os.listdir(directory))
+        if name.startswith("part-") and name.endswith(".parquet")
+    ]
+
+
+def write_file(directory: str, table: pa.Table, name: str | None = None) -> str:
+    """Writes the table to a new file of the directory, returns its path."""
+    os.makedirs(directory, exist_ok=True)
+    if name is None:
+        name = f"part-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.parquet"
+    path = os.path.join(directory, name)
+    tmp_path = os.path.join(directory, f".{name}.tmp")
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_files(paths: Sequence[str], columns: Sequence[str] | None = None) -> pa.Table:
+    """Reads the files memory mapped, keeps the last row of every date."""
+    if not paths:
+        return pa.table({})
+
+    tables = [pq.read_table(path, columns=columns, memory_map=True) for path in paths]
+    # Widens the columns of the files written with another storage.
+    table = pa.concat_tables(tables, promote_options="permissive")
+    if "date" not in table.column_names:
+        return table
+
+    last = (
+        table.append_column("__row", pa.array(range(table.num_rows), pa.int64()))
+        .group_by("date")
+        .aggregate([("__row", "max")])
+    )
+    indices = pc.sort_indices(last, sort_keys=[("date", "ascending")])
+    return table.take(pc.take(last["__row_max"], indices))
+
+
+def conform(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    """Casts the columns of the table to the schema, missing ones are nulls.
+
+    Columns the schema doesn't know are kept as they are.
+    """
+    arrays = [
+        table[field.name].cast(field.type)
+        if field.name in table.column_names
+        else pa.nulls(table.num_rows, field.type)
+        for field in schema
+    ]
+    extra = [field for field in table.schema if field.name not in schema.names]
+    return pa.Table.from_arrays(
+        arrays + [table[field.name] for field in extra],
+        schema=pa.schema(list(schema) + extra),
+    )
+
+
+def compact_partition(
+    directory: str, max_files: int, schema: pa.Schema | None = None
+) -> str | None:
+    """Merges the files of the partition into one when there are more than max.
+
+    Args:
+      directory - the directory of the partition.
+      max_files - the max number of files left as is.
+      schema - the schema of the merged file, the widest types when None.
+
+    Returns:
+      the path of the merged file or None when the partition is left as is.
+    """
+    paths = partition_files(directory)
+    if len(paths) <= max_files:
+        return None
+
+    table = read_files(paths)
+    if schema is not None:
+        table = conform(table, schema)
+    # The newest name keeps the merged file before the files written later.
+    name = os.path.basename(paths[-1])
+    path = write_file(directory, table, name=name)
+    for old in paths[:-1]:
+        os.remove(old)
+    return path
+
+
+def write_partitions(
+    root: str,
+    columns: Sequence[Column],
+    rows: Sequence[Sequence[Any]],
+    max_files: int = 16,
+) -> List[str]:
+    """Writes the history rows to the files of their partitions.
+
+    Args:
+      root - the root directory of the dataset.
+      columns - the names and the types of the columns, symbol and date first.
+      rows - the values of the rows.
+      max_files - the number of files of a partition triggering its compaction.
+
+    Returns:
+      paths of the written files.
+    """
+    partitions: Dict[Tuple[str, int], List[Sequence[Any]]] = defaultdict(list)
+    for row in rows:
+        symbol, day = row[0], row[1]
+        if day is None:
+            continue
+        partitions[(symbol, day.year)].append(row)
+
+    schema = arrow_schema(columns)
+    paths = []
+    for (symbol, year), partition in sorted(partitions.items()):
+        table = pa.Table.from_arrays(
+            [
+                pa.array(values, type=field.type)
+                for values, field in zip(zip(*partition), schema)
+            ],
+            schema=schema,
+        )
+        directory = partition_dir(root, symbol, year)
+        path = write_file(directory, table)
+        paths.append(compact_partition(directory, max_files, schema) or path)
+    return paths
+
+
+def read_symbol(
+    root: str,
+    symbol: str,
+    start: date | None = None,
+    end: date | None = None,
+    columns: Sequence[str] | None = None,
+) -> pa.Table:
+    """Reads the bars of the symbol ordered by date.
+
+    The files are memory mapped, so only the pages of the requested columns
+    are read from the disk.
+
+    Args:
+      root - the root directory of the dataset.
+      symbol - the symbol of the ticker.
+      start - the first date to read, inclusive.
+      end - the last date to read, exclusive.
+      columns - the columns to read, all when None.
+
+    Returns:
+      the table of the bars, empty when the symbol is unknown.
+    """
+    symbol_dir = os.path.join(root, f"symbol={symbol}")
+    if not os.path.isdir(symbol_dir):
+        return pa.table({})
+
+    years = sorted(
+        int(name.removeprefix("year="))
+        for name in os.listdir(symbol_dir)
+        if name.startswith("year=")
+    )
+    if start is not None:
+        years = [y for y in years if y >= start.year]
+    if end is not None:
+        years = [y for y in years if y <= end.year]
+
+    if columns is not None and "date" not in columns:
+        columns = ["date", *columns]
+
+    tables = [
+        read_files(partition_files(partition_dir(root, symbol, year)), columns)
+        for year in years
+    ]
+    tables = [t for t in tables if t.num_rows]
+    if not tables:
+        return pa.table({})
+
+    table = pa.concat_tables(tables, promote_options="permissive")
+    if start is not None:
+        table = table.filter(pc.field("date") >= start)
+    if end is not None:
+        table = table.filter(pc.field("date") < end)
+    return table
@@ -0,0 +1,91 @@
+from datetime import timedelta
+import logging
+import os
+
+from typing import Any, Iterable, Mapping, Sequence, Tuple
+
+from bytewax.connectors.kafka import KafkaInput
+from bytewax.dataflow import Dataflow
+from bytewax.outputs import DynamicOutput, StatelessSink
+
+from etl.codec import decode
+from etl.consumers import feature_columns, history_rows
+from etl.lake import write_partitions
+from etl.registry import DEFAULT_INDICATORS, lake_fields, parse_indicators
+
+
+class LakeSink(StatelessSink):
+    def __init__(
+        self, root: str, worker_index: int, features: Sequence[str], max_files: int
+    ):
+        super().__init__()
+
+        self.logger = logging.getLogger(f"etl.lake_consumers.{worker_index}")
+
+        self.root = root
+        self.features = list(features)
+        self.columns = [("symbol", "varchar"), ("date", "date")] + feature_columns(
+            self.features, "double"
+        )
+        self.max_files = max_files
+
+    def write_batch(self, items: Iterable[Tuple[str, Mapping[str, Any]]]):
+        rows = history_rows(items, self.features, "double")
+        paths = write_partitions(self.root, self.columns, rows, self.max_files)
+        self.logger.debug(f"Wrote {len(rows)} bars to {len(paths)} files.")
+
+
+class LakeOutput(DynamicOutput):
+    def __init__(self, root: str, features: Sequence[str], max_files: int = 16):
+        """Constructor.
+
+        Args:
+          root - the root directory of the data lake, see `etl.lake`.
+          features - the fields of the events to store.
+          max_files - the number of files of a partition triggering its compaction.
+        """
+        super().__init__()
+        self.root = root
+        self.features = features
+        self.max_files = max_files
+
+    def build(self, worker_index: int, worker_count: int) -> LakeSink:
+        return LakeSink(self.root, worker_index, self.features, self.max_files)
+
+
+def sink_to_lake():
+    BOOTSTRAP_SERVERS = os.getenv("BOOTSTRAP_SERVERS", "localhost:19092").split(",")
+    KAFKA_INPUT_TOPICS = os.getenv("KAFKA_INPUT_TOPICS", "features").split(",")
+    INDICATORS = os.getenv("INDICATORS") or DEFAULT_INDICATORS
+    LAKE_DIR = os.getenv("LAKE_DIR", "/cache/lake")
+    LAKE_MAX_FILES = int(os.getenv("LAKE_MAX_FILES", "16"))
+
+    flow = Dataflow()
+    flow.input(
+        "events",
+        KafkaInput(
+            brokers=BOOTSTRAP_SERVERS,
+            topics=KAFKA_INPUT_TOPICS,
+        ),
+    )
+
+    def deserialize(key__payload):
+        key, payload = key__payload
+
+        return key.decode("utf8"), decode(payload)
+
+    flow.map(deserialize)
+
+    # Events of a symbol are batched by one worker, so only that worker
+    # writes and compacts the symbol's partitions.
+    flow.batch("prebatch", 1000, timedelta(seconds=60))
+    flow.output(
+        "sink_to_lake",
+        LakeOutput(
+            LAKE_DIR,
+            features=lake_fields(parse_indicators(INDICATORS)),
+            max_files=LAKE_MAX_FILES,
+        ),
+    )
+
+    return flow
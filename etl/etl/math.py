@@ -1,22 +1,163 @@
+import copy
 import heapq
-from typing import Any, Mapping, Tuple
-
+from array import array
+from collections import deque
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
 from bytewax.dataflow import Dataflow
 
 KV = Mapping[str, Any]
-State = KV
+# State of an indicator, every indicator defines its own.
+State = Any
+# Series of the fields of consecutive events of one symbol.
+Columns = Dict[str, np.ndarray]
+
+PRICE_FIELDS = ("open", "high", "low", "close", "volume")
+
+# Indicators available to the feature sets by the class name, see etl.registry.
+REGISTRY: Dict[str, type] = {}
+
+
+def register(cls: type) -> type:
+    """Makes the indicator available to the feature sets.
+
+    An indicator declares the `fields` it adds to the events, the
+    `history_fields` of them stored in the history table and the fields of
+    the other indicators it `requires`.
+    """
+    REGISTRY[cls.__name__] = cls
+    return cls
 
 
 def exponential_moving_average(alpha: float, current: float, ma: float) -> float:
     return alpha * current + (1.0 - alpha) * ma
 
 
+def exponential_moving_averages(
+    alpha: float, values: np.ndarray, ma: float | None = None
+) -> np.ndarray:
+    """Vectorized `exponential_moving_average` over the series.
+
+    Args:
+      alpha - the smoothing factor.
+      values - the series.
+      ma - the average before the series, the first value seeds it by default.
+
+    Returns:
+      the averages after every value of the series.
+    """
+    if ma is None:
+        ma = values[0]
+    averages = pd.Series(np.concatenate(([ma], values))).ewm(alpha=alpha, adjust=False)
+    return averages.mean().to_numpy()[1:]
+
+
+def previous(values: np.ndarray, first: float) -> np.ndarray:
+    """Shifts the series by one, `first` takes the place of the first value."""
+    return np.concatenate(([first], values[:-1]))
+
+
+class RollingMin:
+    """Minimum of the last `window` values.
+
+    Keeps a monotonic deque of the values that can still become the minimum,
+    so an update is amortized O(1) and the state holds at most `window` values.
+    """
+
+    __slots__ = ("window", "count", "values")
+
+    def __init__(self, window: int):
+        self.window = window
+        self.count = 0
+        self.values = deque()
+
+    @staticmethod
+    def dominates(new: float, old: float) -> bool:
+        return new <= old
+
+    def push(self, value: float) -> float:
+        """Adds the value and returns the extremum of the window."""
+        while self.values and self.dominates(value, self.values[-1][1]):
+            self.values.pop()
+        self.values.append((self.count, value))
+        self.count += 1
+
+        if self.values[0][0] <= self.count - 1 - self.window:
+            self.values.popleft()
+
+        return self.values[0][1]
+
+
+class RingBuffer:
+    """Last `capacity` floats in an array.
+
+    The array grows up to the capacity, then appending overwrites the oldest
+    value. Indexing works like for a list of the values in the order of
+    appending, so `buffer[-k]` is the k-th latest. Pickles as the raw bytes
+    of the values, which keeps snapshots small.
+    """
+
+    __slots__ = ("capacity", "data", "start", "size")
+
+    def __init__(self, capacity: int, values: Sequence[float] = ()):
+        self.capacity = capacity
+        self.data = array("d")
+        self.start = 0
+        self.size = 0
+        for value in values:
+            self.append(value)
+
+    def append(self, value: float):
+        if self.size < self.capacity:
+            self.data.append(value)
+            self.size += 1
+        else:
+            self.data[self.start] = value
+            self.start = (self.start + 1) % self.capacity
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, i: int) -> float:
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError("ring buffer index out of range")
+        return self.data[(self.start + i) % self.capacity]
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield self.data[(self.start + i) % self.capacity]
+
+    def __reduce__(self):
+        return RingBuffer, (self.capacity, array("d", self))
+
+
+class RollingMax(RollingMin):
+    """Maximum of the last `window` values."""
+
+    __slots__ = ()
+
+    @staticmethod
+    def dominates(new: float, old: float) -> bool:
+        return new >= old
+
+
+@register
 class AverageTrueRange:
     """Average true range.
 
     https://www.investopedia.com/terms/a/atr.asp
     """
 
+    fields = ("tr", "atr")
+    history_fields = ()
+    requires = ()
+
     def __init__(self, p: float):
         """Constructor.
 
@@ -25,32 +166,65 @@ class AverageTrueRange:
         """
         self.alpha = 2.0 / (p + 1.0)
 
-    @staticmethod
-    def builder() -> State:
-        return {"close": None, "atr": None}
+    @dataclass(slots=True)
+    class State:
+        close: float | None = None
+        atr: float | None = None
+
+    @classmethod
+    def builder(cls) -> "AverageTrueRange.State":
+        return cls.State()
 
     @staticmethod
     def true_range(high: float, low: float, close_prev: float) -> float:
         return max(high - low, abs(high - close_prev), abs(low - close_prev))
 
-    def mapper(self, state: State, current: KV) -> Tuple[KV, KV]:
+    def mapper(self, state: State, current: KV) -> Tuple[State, KV]:
         tr = self.true_range(
-            current["high"], current["low"], state["close"] or current["high"]
+            current["high"], current["low"], state.close or current["high"]
         )
-        atr = exponential_moving_average(self.alpha, tr, state["atr"] or tr)
+        atr = exponential_moving_average(self.alpha, tr, state.atr or tr)
         current.update({"tr": tr, "atr": atr})
-        return current, current
+        state.close = current["close"]
+        state.atr = atr
+        return state, current
+
+    def vectorized(self, state: State, columns: Columns) -> State:
+        high, low, close = columns["high"], columns["low"], columns["close"]
+        close_prev = previous(close, state.close or high[0])
+        close_prev = np.where(close_prev == 0.0, high, close_prev)
+        tr = np.maximum(
+            high - low, np.maximum(np.abs(high - close_prev), np.abs(low - close_prev))
+        )
+
+        if state.atr:
+            atr = exponential_moving_averages(self.alpha, tr, state.atr)
+        else:
+            # The mapper reseeds a zero average with the true range.
+            atr = np.zeros_like(tr)
+            nonzero = np.flatnonzero(tr)
+            if len(nonzero):
+                start = nonzero[0]
+                atr[start:] = exponential_moving_averages(self.alpha, tr[start:])
+
+        columns.update({"tr": tr, "atr": atr})
+        return self.State(close=float(close[-1]), atr=float(atr[-1]))
 
     def __call__(self, flow: Dataflow):
         flow.stateful_map("Calculate ATR", self.builder, self.mapper)
 
 
+@register
 class AverageDirectionalIndex:
     """Average Directional Index.
 
     https://www.investopedia.com/terms/a/adx.asp
     """
 
+    fields = ("apdm", "andm", "pdi", "ndi", "adx")
+    history_fields = ("pdi", "ndi", "adx")
+    requires = ("atr",)
+
     def __init__(self, p: float):
         """Constructor.
 
@@ -59,17 +233,32 @@ class AverageDirectionalIndex:
         self.alpha = 2.0 / (p + 1.0)
         self.p = p
 
-    @staticmethod
-    def builder() -> State:
-        return {}
+    @dataclass(slots=True)
+    class State:
+        high: float | None = None
+        low: float | None = None
+        apdm: float | None = None
+        andm: float | None = None
+        adx: float | None = None
+
+    @classmethod
+    def builder(cls) -> "AverageDirectionalIndex.State":
+        return cls.State()
 
     def mapper(self, state: State, current: KV) -> Tuple[State, KV]:
-        up_move = current["high"] - state.get("high", current["high"])
-        down_move = state.get("low", current["low"]) - current["low"]
+        if state.high is None:
+            state = self.State(high=current["high"], low=current["low"])
+
+        up_move = current["high"] - state.high
+        down_move = state.low - current["low"]
         pdm = up_move if up_move > down_move else 0.0
         ndm = down_move if down_move > up_move else 0.0
-        apdm = exponential_moving_average(self.alpha, pdm, state.get("apdm", pdm))
-        andm = exponential_moving_average(self.alpha, ndm, state.get("andm", ndm))
+        apdm = exponential_moving_average(
+            self.alpha, pdm, pdm if state.apdm is None else state.apdm
+        )
+        andm = exponential_moving_average(
+            self.alpha, ndm, ndm if state.andm is None else state.andm
+        )
 
         if abs(current["atr"]) < 1e-3:
             pdi = 0.0
@@ -82,41 +271,88 @@ class AverageDirectionalIndex:
             dx = 0.0
         else:
             dx = 100.0 * (abs(pdi - ndi) / abs(pdi + ndi))
-        adx = exponential_moving_average(self.alpha, dx, state.get("adx", dx))
+        adx = exponential_moving_average(
+            self.alpha, dx, dx if state.adx is None else state.adx
+        )
 
         current.update({"apdm": apdm, "andm": andm, "pdi": pdi, "ndi": ndi, "adx": adx})
-        return current, current
+        state.high = current["high"]
+        state.low = current["low"]
+        state.apdm = apdm
+        state.andm = andm
+        state.adx = adx
+        return state, current
+
+    def vectorized(self, state: State, columns: Columns) -> State:
+        high, low, atr = columns["high"], columns["low"], columns["atr"]
+        high_prev = high[0] if state.high is None else state.high
+        low_prev = low[0] if state.low is None else state.low
+        up_move = high - previous(high, high_prev)
+        down_move = previous(low, low_prev) - low
+        pdm = np.where(up_move > down_move, up_move, 0.0)
+        ndm = np.where(down_move > up_move, down_move, 0.0)
+        apdm = exponential_moving_averages(self.alpha, pdm, state.apdm)
+        andm = exponential_moving_averages(self.alpha, ndm, state.andm)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            flat = np.abs(atr) < 1e-3
+            pdi = np.where(flat, 0.0, 100.0 * (apdm / atr))
+            ndi = np.where(flat, 0.0, 100.0 * (andm / atr))
+
+            flat = np.abs(pdi + ndi) < 1e-3
+            dx = np.where(flat, 0.0, 100.0 * (np.abs(pdi - ndi) / np.abs(pdi + ndi)))
+        adx = exponential_moving_averages(self.alpha, dx, state.adx)
+
+        columns.update({"apdm": apdm, "andm": andm, "pdi": pdi, "ndi": ndi, "adx": adx})
+        return self.State(
+            high=float(high[-1]),
+            low=float(low[-1]),
+            apdm=float(apdm[-1]),
+            andm=float(andm[-1]),
+            adx=float(adx[-1]),
+        )
 
     def __call__(self, flow: Dataflow):
         flow.stateful_map("Calculate ADX", self.builder, self.mapper)
 
 
+@register
 class MACD:
     """Moving Average Convergence/Divergence.
 
     https://www.investopedia.com/terms/m/macd.asp
     """
 
+    fields = ("close_ma_12", "close_ma_26", "macd", "macd_signal")
+    history_fields = ("macd", "macd_signal")
+    requires = ()
+
     def __init__(self):
         self.alpha_9 = 2.0 / (9.0 + 1.0)
         self.alpha_12 = 2.0 / (12.0 + 1.0)
         self.alpha_26 = 2.0 / (26.0 + 1.0)
 
-    @staticmethod
-    def builder() -> State:
-        return {}
+    @dataclass(slots=True)
+    class State:
+        close_ma_12: float | None = None
+        close_ma_26: float | None = None
+        macd_signal: float | None = None
 
-    def mapper(self, state: State, current: KV) -> Tuple[KV, KV]:
-        c_ma_12 = exponential_moving_average(
-            self.alpha_12, current["close"], state.get("close_ma_12", current["close"])
-        )
-        c_ma_26 = exponential_moving_average(
-            self.alpha_26, current["close"], state.get("close_ma_26", current["close"])
-        )
+    @classmethod
+    def builder(cls) -> "MACD.State":
+        return cls.State()
+
+    def mapper(self, state: State, current: KV) -> Tuple[State, KV]:
+        close = current["close"]
+        if state.close_ma_12 is None:
+            state = self.State(close_ma_12=close, close_ma_26=close)
+
+        c_ma_12 = exponential_moving_average(self.alpha_12, close, state.close_ma_12)
+        c_ma_26 = exponential_moving_average(self.alpha_26, close, state.close_ma_26)
         macd = c_ma_12 - c_ma_26
 
         macd_signal = exponential_moving_average(
-            self.alpha_9, macd, state.get("macd_signal", macd)
+            self.alpha_9, macd, macd if state.macd_signal is None else state.macd_signal
         )
 
         current.update(
@@ -127,38 +363,71 @@ class MACD:
                 "macd_signal": macd_signal,
             }
         )
-        return current, current
+        state.close_ma_12 = c_ma_12
+        state.close_ma_26 = c_ma_26
+        state.macd_signal = macd_signal
+        return state, current
+
+    def vectorized(self, state: State, columns: Columns) -> State:
+        close = columns["close"]
+        c_ma_12 = exponential_moving_averages(self.alpha_12, close, state.close_ma_12)
+        c_ma_26 = exponential_moving_averages(self.alpha_26, close, state.close_ma_26)
+        macd = c_ma_12 - c_ma_26
+        macd_signal = exponential_moving_averages(self.alpha_9, macd, state.macd_signal)
+
+        columns.update(
+            {
+                "close_ma_12": c_ma_12,
+                "close_ma_26": c_ma_26,
+                "macd": macd,
+                "macd_signal": macd_signal,
+            }
+        )
+        return self.State(
+            close_ma_12=float(c_ma_12[-1]),
+            close_ma_26=float(c_ma_26[-1]),
+            macd_signal=float(macd_signal[-1]),
+        )
 
     def __call__(self, flow: Dataflow):
         flow.stateful_map("Calculate MACD", self.builder, self.mapper)
 
 
+@register
 class RSI:
     """Relative Strength Index.
 
     https://www.investopedia.com/terms/r/rsi.asp
     """
 
+    fields = ("pct_change", "gain_ma", "loss_ma", "rsi")
+    history_fields = ("rsi",)
+    requires = ()
+
     def __init__(self) -> None:
         self.alpha = 2.0 / (14.0 + 1.0)
 
-    @staticmethod
-    def builder() -> State:
-        return {}
+    @dataclass(slots=True)
+    class State:
+        close: float | None = None
+        gain_ma: float | None = None
+        loss_ma: float | None = None
+
+    @classmethod
+    def builder(cls) -> "RSI.State":
+        return cls.State()
 
-    def mapper(self, state: State, current: KV) -> Tuple[KV, KV]:
-        close_prev = state.get("close", current["close"])
+    def mapper(self, state: State, current: KV) -> Tuple[State, KV]:
+        close_prev = current["close"] if state.close is None else state.close
         pct_change = (current["close"] - close_prev) / close_prev
 
         gain = pct_change if pct_change > 0 else 0.0
         loss = -1.0 * pct_change if pct_change < 0 else 0.0
 
-        gain_ma = exponential_moving_average(
-            self.alpha, gain, state.get("gain_ma", gain)
-        )
-        loss_ma = exponential_moving_average(
-            self.alpha, loss, state.get("loss_ma", gain)
-        )
+        if state.gain_ma is None:
+            state = self.State(gain_ma=gain, loss_ma=gain)
+        gain_ma = exponential_moving_average(self.alpha, gain, state.gain_ma)
+        loss_ma = exponential_moving_average(self.alpha, loss, state.loss_ma)
 
         if loss_ma > 0:
             rsi = 100.0 - (100.0 / (1.0 + gain_ma / loss_ma))
@@ -172,15 +441,53 @@ class RSI:
                 "rsi": rsi,
             }
         )
-        return current, current
+        state.close = current["close"]
+        state.gain_ma = gain_ma
+        state.loss_ma = loss_ma
+        return state, current
+
+    def vectorized(self, state: State, columns: Columns) -> State:
+        close = columns["close"]
+        close_prev = previous(close, close[0] if state.close is None else state.close)
+        pct_change = (close - close_prev) / close_prev
+
+        gain = np.where(pct_change > 0, pct_change, 0.0)
+        loss = np.where(pct_change < 0, -1.0 * pct_change, 0.0)
+
+        gain_ma = exponential_moving_averages(self.alpha, gain, state.gain_ma)
+        loss_ma = exponential_moving_averages(
+            self.alpha, loss, gain[0] if state.loss_ma is None else state.loss_ma
+        )
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = np.where(
+                loss_ma > 0, 100.0 - (100.0 / (1.0 + gain_ma / loss_ma)), 100.0
+            )
+
+        columns.update(
+            {
+                "pct_change": pct_change,
+                "gain_ma": gain_ma,
+                "loss_ma": loss_ma,
+                "rsi": rsi,
+            }
+        )
+        return self.State(
+            close=float(close[-1]),
+            gain_ma=float(gain_ma[-1]),
+            loss_ma=float(loss_ma[-1]),
+        )
 
     def __call__(self, flow: Dataflow):
         flow.stateful_map("Calculate RSI", self.builder, self.mapper)
 
 
+@register
 class MA:
     """Moving average."""
 
+    requires = ()
+
     def __init__(self, window: int) -> None:
         """Constructor.
 
@@ -189,18 +496,26 @@ class MA:
         """
         self.window = window
         self.name = f"moving_average_{window}"
+        self.fields = (self.name,)
+        self.history_fields = (self.name,)
         self.alpha = 2.0 / (window + 1.0)
 
     @staticmethod
-    def builder() -> State:
-        return {}
+    def builder() -> float | None:
+        # The state is the average itself.
+        return None
 
-    def mapper(self, state: State, current: KV) -> Tuple[KV, KV]:
+    def mapper(self, state: float | None, current: KV) -> Tuple[float, KV]:
         c_ma = exponential_moving_average(
-            self.alpha, current["close"], state.get(self.name, current["close"])
+            self.alpha, current["close"], current["close"] if state is None else state
         )
         current.update({self.name: c_ma})
-        return {self.name: c_ma}, current
+        return c_ma, current
+
+    def vectorized(self, state: float | None, columns: Columns) -> float:
+        c_ma = exponential_moving_averages(self.alpha, columns["close"], state)
+        columns.update({self.name: c_ma})
+        return float(c_ma[-1])
 
     def __call__(self, flow: Dataflow):
         flow.stateful_map(
@@ -208,24 +523,38 @@ class MA:
         )
 
 
+@register
 class MFI:
     """Money Flow Index.
 
     https://www.investopedia.com/terms/m/mfi.asp
     """
 
+    fields = ("money_flow_index", "mfi_delta")
+    history_fields = ("money_flow_index",)
+    requires = ()
+
     def __init__(self) -> None:
         self.alpha = 2.0 / (14.0 + 1.0)
 
-    @staticmethod
-    def builder() -> State:
-        return {}
+    @dataclass(slots=True)
+    class State:
+        typical_price: float | None = None
+        positive_money_flow_ma: float | None = None
+        negative_money_flow_ma: float | None = None
+        money_flow_index: float | None = None
 
-    def mapper(self, state: State, current: KV) -> Tuple[KV, KV]:
+    @classmethod
+    def builder(cls) -> "MFI.State":
+        return cls.State()
+
+    def mapper(self, state: State, current: KV) -> Tuple[State, KV]:
         typical_price = (current["close"] + current["high"] + current["low"]) / 3.0
         raw_money_flow = typical_price * current["volume"]
 
-        typical_price_prev = state.get("typical_price", typical_price)
+        if state.typical_price is None:
+            state = self.State(typical_price=typical_price)
+        typical_price_prev = state.typical_price
         positive_money_flow = (
             raw_money_flow if typical_price > typical_price_prev else 0.0
         )
@@ -236,13 +565,17 @@ class MFI:
         positive_money_flow_ma = exponential_moving_average(
             self.alpha,
             positive_money_flow,
-            state.get("positive_money_flow_ma", positive_money_flow),
+            positive_money_flow
+            if state.positive_money_flow_ma is None
+            else state.positive_money_flow_ma,
         )
 
         negative_money_flow_ma = exponential_moving_average(
             self.alpha,
             negative_money_flow,
-            state.get("negative_money_flow_ma", negative_money_flow),
+            negative_money_flow
+            if state.negative_money_flow_ma is None
+            else state.negative_money_flow_ma,
         )
 
         if negative_money_flow_ma > 0:
@@ -256,73 +589,150 @@ class MFI:
             {
                 "money_flow_index": money_flow_index,
                 "mfi_delta": money_flow_index
-                - state.get("money_flow_index", money_flow_index),
+                - (
+                    money_flow_index
+                    if state.money_flow_index is None
+                    else state.money_flow_index
+                ),
             }
         )
 
-        state.update(
+        state.typical_price = typical_price
+        state.positive_money_flow_ma = positive_money_flow_ma
+        state.negative_money_flow_ma = negative_money_flow_ma
+        state.money_flow_index = money_flow_index
+
+        return state, current
+
+    def vectorized(self, state: State, columns: Columns) -> State:
+        typical_price = (columns["close"] + columns["high"] + columns["low"]) / 3.0
+        raw_money_flow = typical_price * columns["volume"]
+
+        typical_price_prev = previous(
+            typical_price,
+            typical_price[0] if state.typical_price is None else state.typical_price,
+        )
+        positive_money_flow = np.where(
+            typical_price > typical_price_prev, raw_money_flow, 0.0
+        )
+        negative_money_flow = np.where(
+            typical_price < typical_price_prev, raw_money_flow, 0.0
+        )
+
+        positive_money_flow_ma = exponential_moving_averages(
+            self.alpha, positive_money_flow, state.positive_money_flow_ma
+        )
+        negative_money_flow_ma = exponential_moving_averages(
+            self.alpha, negative_money_flow, state.negative_money_flow_ma
+        )
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            money_flow_ratio = np.where(
+                negative_money_flow_ma > 0,
+                positive_money_flow_ma / negative_money_flow_ma,
+                10000.0,
+            )
+        money_flow_index = 100.0 - (100.0 / (1 + money_flow_ratio))
+
+        columns.update(
             {
-                "typical_price": typical_price,
-                "positive_money_flow_ma": positive_money_flow_ma,
-                "negative_money_flow_ma": negative_money_flow_ma,
                 "money_flow_index": money_flow_index,
+                "mfi_delta": money_flow_index
+                - previous(
+                    money_flow_index,
+                    money_flow_index[0]
+                    if state.money_flow_index is None
+                    else state.money_flow_index,
+                ),
             }
         )
-
-        return state, current
+        return self.State(
+            typical_price=float(typical_price[-1]),
+            positive_money_flow_ma=float(positive_money_flow_ma[-1]),
+            negative_money_flow_ma=float(negative_money_flow_ma[-1]),
+            money_flow_index=float(money_flow_index[-1]),
+        )
 
     def __call__(self, flow: Dataflow):
         flow.stateful_map("Money Flow Index", self.builder, self.mapper)
 
 
+@register
 class SwingLow:
     """Swing Low.
 
     https://www.investopedia.com/terms/s/swinglow.asp
     """
 
-    def __init__(self):
-        self.period = 20
+    fields = ("swing_low",)
+    history_fields = ("swing_low",)
+    requires = ()
 
-    @staticmethod
-    def builder() -> State:
-        return {}
+    def __init__(self, period: int = 20):
+        """Constructor.
+
+        Args:
+          period - the number of bars before the current one to look back.
+        """
+        self.period = period
+
+    def builder(self) -> RollingMin:
+        return RollingMin(window=self.period + 1)
 
-    def mapper(self, state: State, current: KV) -> Tuple[KV, KV]:
-        if "closes" not in state:
-            state["closes"] = []
-        state["closes"].append(current["close"])
-        swing_low = min(state["closes"])
+    def mapper(self, state: RollingMin, current: KV) -> Tuple[RollingMin, KV]:
+        current.update({"swing_low": state.push(current["close"])})
 
-        current.update({"swing_low": swing_low})
+        return state, current
+
+    def vectorized(self, state: RollingMin, columns: Columns) -> RollingMin:
+        # Values dropped from the deque can't be the minimum anymore, so
+        # the minimums are the same with +inf in their place.
+        history = np.full(state.window - 1, np.inf)
+        for index, value in state.values:
+            offset = state.count - 1 - index
+            if offset < state.window - 1:
+                history[-1 - offset] = value
+
+        closes = np.concatenate((history, columns["close"]))
+        windows = np.lib.stride_tricks.sliding_window_view(closes, state.window)
+        columns.update({"swing_low": windows.min(axis=1)})
 
-        return {"closes": state["closes"][-self.period :]}, current
+        rolling_min = RollingMin(window=state.window)
+        for value in closes[-state.window :].tolist():
+            rolling_min.push(value)
+        return rolling_min
 
     def __call__(self, flow: Dataflow):
         flow.stateful_map("Swing Low", self.builder, self.mapper)
 
 
+@register
 class CoppockCurve:
     """Coppock Curve.
 
     https://www.investopedia.com/terms/c/coppockcurve.asp
     """
 
+    fields = ("coppock_curve",)
+    history_fields = ("coppock_curve",)
+    requires = ()
+
     def __init__(self):
         self.roc_long_period = 14 * 22  # 14 monthes, 22 woring days in month
         self.roc_short_period = 10 * 22  # 10 monthes
         self.wma_period = 10 * 22  # 10 monthes
         self.alpha = 2.0 / (self.wma_period + 1.0)
 
-    @staticmethod
-    def builder() -> State:
-        return {}
+    @dataclass(slots=True)
+    class State:
+        closes: RingBuffer
+        coppock_curve: float | None = None
 
-    def mapper(self, state: State, current: KV) -> Tuple[KV, KV]:
-        if "closes" not in state:
-            state["closes"] = []
+    def builder(self) -> "CoppockCurve.State":
+        return self.State(closes=RingBuffer(self.roc_long_period))
 
-        closes = state["closes"][-self.roc_long_period :]
+    def mapper(self, state: State, current: KV) -> Tuple[State, KV]:
+        closes = state.closes
         closes.append(current["close"])
 
         if len(closes) < self.roc_long_period:
@@ -341,13 +751,195 @@ class CoppockCurve:
 
         roc = roc_long + roc_short
         coppock_curve = exponential_moving_average(
-            self.alpha, roc, state.get("coppock_curve", roc)
+            self.alpha, roc, roc if state.coppock_curve is None else state.coppock_curve
         )
 
         current.update({"coppock_curve": coppock_curve})
-        state.update({"coppock_curve": coppock_curve, "closes": closes})
+        state.coppock_curve = coppock_curve
 
         return state, current
 
+    def vectorized(self, state: State, columns: Columns) -> State:
+        close = columns["close"]
+        seen = len(state.closes)
+        closes = np.concatenate((np.array(list(state.closes), dtype=float), close))
+        # Position of the current close in the closes.
+        i = np.arange(seen, len(closes))
+        ready = i + 1 >= self.roc_long_period
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            close_long = closes[np.maximum(i - self.roc_long_period + 1, 0)]
+            roc_long = np.where(ready, 100.0 * ((close - close_long) / close_long), 0.0)
+            close_short = closes[np.maximum(i - self.roc_short_period + 1, 0)]
+            roc_short = np.where(
+                ready, 100.0 * ((close - close_short) / close_short), 0.0
+            )
+
+        coppock_curve = exponential_moving_averages(
+            self.alpha, roc_long + roc_short, state.coppock_curve
+        )
+
+        columns.update({"coppock_curve": coppock_curve})
+        return self.State(
+            closes=RingBuffer(
+                self.roc_long_period, closes[-self.roc_long_period :].tolist()
+            ),
+            coppock_curve=float(coppock_curve[-1]),
+        )
+
     def __call__(self, flow: Dataflow):
         flow.stateful_map("Coppock Curve", self.builder, self.mapper)
+
+
+@dataclass(slots=True)
+class IndicatorsState:
+    """State of all the indicators of a symbol."""
+
+    states: List[State]
+    # Specs of the indicators the states belong to.
+    specs: Tuple[str, ...] = ()
+    # The states already include the bars up to this date, so the replayed
+    # bars are skipped. Set only for the states seeded by a warm start.
+    seeded_until: date | None = None
+
+
+class Indicators:
+    """Calculates all the given indicators in one stateful step.
+
+    The per-symbol state holds the states of all the indicators, so an event
+    costs one state lookup instead of one per indicator. The output is the
+    same as chaining the indicators one after another.
+
+    In the backfill mode the events of a symbol are batched and long
+    batches are calculated by the vectorized twins of the indicators, which
+    leave the state the mappers continue from.
+
+    Symbols without a state start from their seed if there is one, see
+    `etl.warm_start`. When the feature set changes, the states of the kept
+    indicators carry over and the added ones start from scratch.
+    """
+
+    # Shorter batches are cheaper to calculate event by event.
+    vectorize_from = 64
+
+    def __init__(
+        self,
+        indicators: Sequence[Any],
+        seeds: Mapping[str, IndicatorsState] | None = None,
+    ):
+        """Constructor.
+
+        Args:
+          indicators - the indicators in the order of calculation.
+          seeds - the initial states of the symbols.
+        """
+        self.indicators = list(indicators)
+        # Indicators parsed from a config know their spec, the position
+        # tells apart the ones made by hand.
+        self.specs = tuple(
+            getattr(indicator, "spec", f"{type(indicator).__name__}#{i}")
+            for i, indicator in enumerate(self.indicators)
+        )
+        self.seeds = seeds or {}
+
+    def builder(self) -> IndicatorsState | None:
+        # The builder doesn't know the symbol, the mappers pick its seed.
+        return None
+
+    def initial_state(self, symbol: str) -> IndicatorsState:
+        if symbol in self.seeds:
+            return copy.deepcopy(self.seeds[symbol])
+        return IndicatorsState(
+            [indicator.builder() for indicator in self.indicators], specs=self.specs
+        )
+
+    def prepare(self, state: IndicatorsState | None, symbol: str) -> IndicatorsState:
+        """Returns the state of the symbol matching the indicators."""
+        if state is None:
+            state = self.initial_state(symbol)
+        if state.specs != self.specs:
+            states = dict(zip(state.specs, state.states))
+            state.states = [
+                states[spec] if spec in states else indicator.builder()
+                for spec, indicator in zip(self.specs, self.indicators)
+            ]
+            state.specs = self.specs
+        return state
+
+    def vectorized(self, states: List[State], columns: Columns) -> List[State]:
+        """Calculates the indicators of the series, adds them to the columns."""
+        for i, indicator in enumerate(self.indicators):
+            states[i] = indicator.vectorized(states[i], columns)
+        return states
+
+    def mapper(
+        self, state: IndicatorsState | None, current: KV
+    ) -> Tuple[IndicatorsState, KV | None]:
+        state = self.prepare(state, current["symbol"])
+        if state.seeded_until is not None:
+            if current["date"].date() <= state.seeded_until:
+                return state, None
+            state.seeded_until = None
+
+        states = state.states
+        for i, indicator in enumerate(self.indicators):
+            states[i], current = indicator.mapper(states[i], current)
+        return state, current
+
+    def batch_mapper(
+        self, state: IndicatorsState | None, events: List[KV]
+    ) -> Tuple[IndicatorsState, List[KV]]:
+        state = self.prepare(state, events[0]["symbol"])
+        if state.seeded_until is not None:
+            events = [e for e in events if e["date"].date() > state.seeded_until]
+            if not events:
+                return state, events
+            state.seeded_until = None
+
+        if len(events) < self.vectorize_from:
+            for i, event in enumerate(events):
+                state, events[i] = self.mapper(state, event)
+            return state, events
+
+        columns = {
+            field: np.array([event[field] for event in events], dtype=float)
+            for field in PRICE_FIELDS
+        }
+        self.vectorized(state.states, columns)
+
+        fields = [field for field in columns if field not in PRICE_FIELDS]
+        rows = zip(*(columns[field].tolist() for field in fields))
+        for event, row in zip(events, rows):
+            event.update(zip(fields, row))
+        return state, events
+
+    def __call__(self, flow: Dataflow):
+        flow.stateful_map("Calculate indicators", self.builder, self.mapper)
+
+        # Seeded states are recovered even when the flow runs without seeds,
+        # so the replayed bars they skip are dropped in any case.
+        def is_calculated(key__payload):
+            _, payload = key__payload
+            return payload is not None
+
+        flow.filter(is_calculated)
+
+    def backfill(self, flow: Dataflow, batch_size: int, timeout: timedelta):
+        """Adds the steps calculating the indicators in batches.
+
+        The state is compatible with the one of the streaming step, so the
+        flow can be switched between the modes.
+
+        Args:
+          flow - the flow of the events keyed by symbol.
+          batch_size - the max number of events of a symbol in a batch.
+          timeout - the max time to wait for a batch to fill.
+        """
+        flow.batch("Batch events", max_size=batch_size, timeout=timeout)
+        flow.stateful_map("Calculate indicators", self.builder, self.batch_mapper)
+
+        def unbatch(key__events):
+            key, events = key__events
+            return [(key, event) for event in events]
+
+        flow.flat_map(unbatch)
@@ -1,27 +1,95 @@
-from datetime import datetime, timedelta
-import json
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+import logging
 import os
 import time
 
 from requests import HTTPError
-import psycopg
-from typing import Any, Iterable, Mapping, Sequence, Set, Tuple
+from typing import Any, Dict, Iterable, List, Mapping, Sequence, Set, Tuple
 
 from bytewax.connectors.kafka import KafkaInput
 from bytewax.dataflow import Dataflow
 from bytewax.outputs import DynamicOutput, StatelessSink
-from etl.notifyer import NotificationCenter
+from etl.codec import decode
+from etl.db import acquire_pool, with_retries
+from etl.notifyer import LEGACY_RESOURCE, NotificationCenter, load_last_actions
 from etl.telegram.client import TelegramClient
-from etl.rules import (
-    Action,
-    Decision,
-    adx_rule,
-    macd_rule,
-    rsi_rule,
-    mfi_rule,
-    swing_low_rule,
-    coppock_curve_rule,
-)
+from etl.rules import Action, Decision, Signal, evaluate
+
+
+# Rule's name to its last action, of a symbol.
+LastActions = Dict[str, Action]
+
+
+@dataclass(slots=True)
+class RulesState:
+    actions: LastActions = field(default_factory=dict)
+    # Date of the latest evaluated bar, older bars are replays.
+    watermark: datetime | None = None
+
+
+class RuleTransitions:
+    """Keeps the last action of every rule of a symbol, emits only the changes.
+
+    Bars older than the horizon only warm the state up: a replay of the
+    history doesn't notify on the stale crossings. Bars not newer than the
+    latest evaluated one of the symbol are skipped.
+
+    The state is a part of the flow's state, so the recovery covers it.
+    """
+
+    def __init__(
+        self,
+        seeds: Mapping[str, LastActions] | None = None,
+        horizon: timedelta | None = None,
+    ):
+        """Constructor.
+
+        Args:
+          seeds - the initial last actions of the symbols.
+          horizon - the age of the oldest bar emitting the changes, all when None.
+        """
+        self.seeds = seeds or {}
+        self.horizon = horizon
+
+    def builder(self) -> RulesState | None:
+        # The builder doesn't know the symbol, the mapper seeds the state.
+        return None
+
+    def mapper(
+        self, state: RulesState | None, date__signals: Tuple[str, Sequence[Signal]]
+    ) -> Tuple[RulesState | None, List[Signal]]:
+        date, signals = date__signals
+        if not signals:
+            return state, []
+        if state is None:
+            state = RulesState(actions=dict(self.seeds.get(signals[0].ticker, {})))
+
+        date = datetime.fromisoformat(date)
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+        if state.watermark is not None and date <= state.watermark:
+            return state, []
+        state.watermark = date
+
+        live = (
+            self.horizon is None or datetime.now(timezone.utc) - date <= self.horizon
+        )
+        transitions = []
+        for signal in signals:
+            name = signal.check.rule.name
+            if state.actions.get(name) != signal.action:
+                state.actions[name] = signal.action
+                if live:
+                    transitions.append(signal)
+        return state, transitions
+
+    def __call__(self, flow: Dataflow):
+        """Adds the step keeping the last actions of the signals keyed by symbol.
+
+        The values are the ISO dates of the bars and their signals.
+        """
+        flow.stateful_map("Rule transitions", self.builder, self.mapper)
 
 
 class NotifierSink(StatelessSink):
@@ -32,14 +100,11 @@ class NotifierSink(StatelessSink):
         self.notify = NotificationCenter()
         self.notify.add_telegram(self.telegram_client)
 
-    def close(self):
-        self.notify.persist()
-
     def write_batch(self, items: Iterable[Tuple[str, Decision]]):
         for key__payload in items:
             _, decision = key__payload
             try:
-                self.notify.send_unique_decision("dbihbka", decision)
+                self.notify.send_decision("dbihbka", decision)
             except HTTPError:
                 time.sleep(2)
 
@@ -61,6 +126,8 @@ def notify():
 
     BOOTSTRAP_SERVERS = os.getenv("BOOTSTRAP_SERVERS", "localhost:19092").split(",")
     KAFKA_INPUT_TOPICS = os.getenv("KAFKA_INPUT_TOPICS", "features").split(",")
+    # Older bars only warm the rules' state up, not positive disables the horizon.
+    MONITOR_HORIZON_DAYS = int(os.getenv("MONITOR_HORIZON_DAYS", "4"))
 
     telegram_bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
     assert telegram_bot_token, "Missing TELEGRAM_BOT_TOKEN"
@@ -75,58 +142,42 @@ def notify():
     )
 
     def deserialize(raw_item_kv):
-        item_v = json.loads(raw_item_kv[1])
+        item_v = decode(raw_item_kv[1])
         return item_v["symbol"], item_v
 
     flow.map(deserialize)
 
     def apply_rules(
         key__payload: Tuple[str, Mapping[str, Any]]
-    ) -> Sequence[Tuple[str, Decision]]:
+    ) -> Tuple[str, Tuple[str, Sequence[Signal]]]:
         key, payload = key__payload
-        return [
-            (key, decision)
-            for decision in [
-                macd_rule(
-                    payload["symbol"],
-                    payload["close"],
-                    payload["macd"],
-                    payload["macd_signal"],
-                ),
-                adx_rule(
-                    payload["symbol"],
-                    payload["close"],
-                    payload["pdi"],
-                    payload["ndi"],
-                    payload["adx"],
-                ),
-                rsi_rule(payload["symbol"], payload["close"], payload["rsi"]),
-                mfi_rule(
-                    payload["symbol"],
-                    current_price=payload["close"],
-                    pct_change=payload["pct_change"],
-                    mfi_value=payload["money_flow_index"],
-                    mfi_delta=payload["mfi_delta"],
-                ),
-                swing_low_rule(
-                    payload["symbol"],
-                    current_price=payload["close"],
-                    swing_low=payload["swing_low"],
-                ),
-                coppock_curve_rule(
-                    payload["symbol"],
-                    current_price=payload["close"],
-                    coppock_curve=payload["coppock_curve"],
-                ),
-            ]
-        ]
-
-    flow.flat_map(apply_rules)
+        # HOLD signals are dropped, they never pass the portfolio filter.
+        return key, (payload["date"], evaluate(payload))
+
+    flow.map(apply_rules)
+
+    RuleTransitions(
+        # The last actions sent before the flow kept them.
+        seeds=load_last_actions(LEGACY_RESOURCE, "dbihbka"),
+        horizon=(
+            timedelta(days=MONITOR_HORIZON_DAYS) if MONITOR_HORIZON_DAYS > 0 else None
+        ),
+    )(flow)
+
+    def unpack(key__signals: Tuple[str, Sequence[Signal]]) -> List[Tuple[str, Signal]]:
+        key, signals = key__signals
+        return [(key, signal) for signal in signals]
+
+    flow.flat_map(unpack)
 
     class FilterWithPortfolioInfo:
         def __init__(self, db_host: str, db_user: str, db_name: str, db_password: str):
-            conn_info = f"postgresql://{db_user}:{db_password}@{db_host}:5432/{db_name}"
-            self.connection = psycopg.connect(conn_info)
+            self.conn_info = (
+                f"postgresql://{db_user}:{db_password}@{db_host}:5432/{db_name}"
+            )
+            # The pool is opened on the first use, by the worker.
+            self.pool = None
+            self.logger = logging.getLogger("etl.monitor")
 
             self.last_update_time = datetime.now()
             self._portfolio = None
@@ -137,25 +188,37 @@ def notify():
                 self._portfolio is None
                 or datetime.now() - self.last_update_time > timedelta(days=1)
             ):
-                with self.connection.cursor() as cur:
-                    cur.execute("SELECT symbol FROM tickers WHERE in_portfolio;")
-                    self._portfolio = set([x[0] for x in cur.fetchall()])
-                self.connection.commit()
-                
+                if self.pool is None:
+                    self.pool = acquire_pool(self.conn_info, max_size=1)
+
+                def fetch_portfolio(connection):
+                    with connection.cursor() as cur:
+                        cur.execute("SELECT symbol FROM tickers WHERE in_portfolio;")
+                        return set([x[0] for x in cur.fetchall()])
+
+                self._portfolio = with_retries(
+                    self.pool, fetch_portfolio, self.logger
+                )
                 self.last_update_time = datetime.now()
             return self._portfolio
 
-        def __call__(self, key__payload: Tuple[str, Decision]) -> bool:
-            symbol, decision = key__payload
-            if symbol in self.portfolio and decision.action == Action.SELL:
+        def __call__(self, key__payload: Tuple[str, Signal]) -> bool:
+            symbol, signal = key__payload
+            if symbol in self.portfolio and signal.action == Action.SELL:
                 return True
-            elif symbol not in self.portfolio and decision.action == Action.BUY:
+            elif symbol not in self.portfolio and signal.action == Action.BUY:
                 return True
             else:
                 return False
 
     flow.filter(FilterWithPortfolioInfo(DB_HOST, DB_USER, DB_NAME, DB_PASSWORD))
 
+    def to_decision(key__signal: Tuple[str, Signal]) -> Tuple[str, Decision]:
+        key, signal = key__signal
+        return key, signal.decision()
+
+    flow.map(to_decision)
+
     flow.output("notify", NotifierOutput(telegram_bot_token))
 
     return flow
@@ -0,0 +1,81 @@
+"""Feature sets configured from the registry of the indicators.
+
+A feature set is a comma separated list of the registered indicators with
+their parameters, e.g. `MA(window=20),RSI()`. The features flow calculates
+exactly these indicators and the history sink stores their history fields,
+so both have to be configured with the same feature set.
+"""
+import ast
+from typing import Any, List, Sequence
+
+from etl.math import REGISTRY
+
+DEFAULT_INDICATORS = ",".join(
+    [
+        "AverageTrueRange(p=14)",
+        "AverageDirectionalIndex(p=14)",
+        "MACD()",
+        "RSI()",
+        "MA(window=50)",
+        "MA(window=200)",
+        "MFI()",
+        "SwingLow()",
+        "CoppockCurve()",
+    ]
+)
+
+# Fields of the events stored in the history table whatever the feature set.
+PRICE_HISTORY_FIELDS = ("open", "high", "low", "close", "volume", "dividends")
+
+
+def parse_indicators(config: str) -> List[Any]:
+    """Makes the indicators of the feature set.
+
+    Args:
+      config - the comma separated indicators with their parameters.
+
+    Returns:
+      the indicators in the order of calculation.
+    """
+    try:
+        calls = ast.parse(f"[{config}]", mode="eval").body.elts
+    except SyntaxError as e:
+        raise ValueError(f"Invalid indicators config {config!r}") from e
+
+    indicators = []
+    available = {"open", "high", "low", "close", "volume"}
+    for call in calls:
+        if not isinstance(call, ast.Call) or not isinstance(call.func, ast.Name):
+            raise ValueError(f"Expected an indicator, got {ast.unparse(call)!r}")
+        if call.func.id not in REGISTRY:
+            raise ValueError(f"Unknown indicator {call.func.id}")
+
+        indicator = REGISTRY[call.func.id](
+            *[ast.literal_eval(arg) for arg in call.args],
+            **{kw.arg: ast.literal_eval(kw.value) for kw in call.keywords},
+        )
+        indicator.spec = ast.unparse(call)
+
+        missing = [field for field in indicator.requires if field not in available]
+        if missing:
+            raise ValueError(f"{indicator.spec} requires {missing} calculated before")
+        available.update(indicator.fields)
+
+        indicators.append(indicator)
+    return indicators
+
+
+def history_fields(indicators: Sequence[Any]) -> List[str]:
+    """Returns the fields stored in the history table."""
+    fields = list(PRICE_HISTORY_FIELDS)
+    for indicator in indicators:
+        fields.extend(f for f in indicator.history_fields if f not in fields)
+    return fields
+
+
+def lake_fields(indicators: Sequence[Any]) -> List[str]:
+    """Returns the fields stored in the data lake, all the calculated ones."""
+    fields = list(PRICE_HISTORY_FIELDS)
+    for indicator in indicators:
+        fields.extend(f for f in indicator.fields if f not in fields)
+    return fields
@@ -0,0 +1,143 @@
+"""Weekly and monthly bars aggregated from the history table.
+
+A bar of an interval opens with the open of its first day and closes with
+the close of its last one, the high and the low are the extremums of the
+interval, the volume is the total. Indicators are averaged.
+
+The sink recomputes only the intervals touched by a batch, in the same
+transaction as the history write, so the rollups are never behind.
+"""
+from datetime import date, timedelta
+from typing import Any, Iterable, List, Mapping, Sequence, Set, Tuple
+
+import psycopg
+
+from etl.sql import Column
+
+# Interval of `date_trunc` to the rollup table.
+ROLLUPS: Mapping[str, str] = {
+    "week": "history_weekly",
+    "month": "history_monthly",
+}
+
+ROLLUP_KEY = ("symbol", "date")
+
+# Symbol, the first day of the interval and the first day of the next one.
+Period = Tuple[str, date, date]
+
+
+def period_start(day: date, interval: str) -> date:
+    """Returns the first day of the interval of the day, as `date_trunc` does."""
+    match interval:
+        case "week":
+            return day - timedelta(days=day.weekday())
+        case "month":
+            return day.replace(day=1)
+        case _:
+            raise ValueError(f"Unknown interval {interval}")
+
+
+def period_end(start: date, interval: str) -> date:
+    """Returns the first day of the interval following the one of `start`."""
+    match interval:
+        case "week":
+            return start + timedelta(days=7)
+        case "month":
+            return (start + timedelta(days=32)).replace(day=1)
+        case _:
+            raise ValueError(f"Unknown interval {interval}")
+
+
+def affected_periods(rows: Iterable[Sequence[Any]], interval: str) -> List[Period]:
+    """Returns the intervals of the history rows, rows start with symbol and date."""
+    periods: Set[Period] = set()
+    for row in rows:
+        symbol, day = row[0], row[1]
+        if day is None:
+            continue
+        start = period_start(day, interval)
+        periods.add((symbol, start, period_end(start, interval)))
+    return sorted(periods)
+
+
+def aggregates(features: Sequence[str]) -> List[Tuple[str, str]]:
+    """Returns the columns of a rollup and their aggregates over history `h`."""
+    known = {
+        "open": "(array_agg(h.open ORDER BY h.date))[1]",
+        "high": "MAX(h.high)",
+        "low": "MIN(h.low)",
+        "close": "(array_agg(h.close ORDER BY h.date DESC))[1]",
+        "volume": "SUM(h.volume)",
+    }
+    return [(f, known.get(f, f"AVG(h.{f})")) for f in features]
+
+
+def create_rollups(cursor: psycopg.Cursor, feature_columns: Sequence[Column]):
+    """Creates the rollup tables, new tables are filled from the whole history.
+
+    Should be called holding the schema lock of the history table.
+    """
+    features = [f for f, _ in feature_columns]
+    features_schema = ",".join([f"{f} {type_}" for f, type_ in feature_columns])
+    columns = aggregates(features)
+    names = ", ".join(["symbol", "date"] + [f for f, _ in columns])
+    values = ", ".join(a for _, a in columns)
+
+    for interval, table in ROLLUPS.items():
+        cursor.execute("SELECT to_regclass(%s)", (table,))
+        exists = cursor.fetchone()[0] is not None
+
+        cursor.execute(
+            f"""CREATE TABLE IF NOT EXISTS {table} (
+                symbol VARCHAR(12) NOT NULL,
+                date DATE NOT NULL,
+                {features_schema},
+                PRIMARY KEY ({', '.join(ROLLUP_KEY)}))
+            """
+        )
+        for f, type_ in feature_columns:
+            cursor.execute(
+                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {f} {type_}"
+            )
+
+        if not exists:
+            cursor.execute(
+                f"""INSERT INTO {table} ({names})
+                SELECT h.symbol, date_trunc('{interval}', h.date)::date, {values}
+                FROM history h
+                WHERE h.date IS NOT NULL
+                GROUP BY 1, 2"""
+            )
+
+
+def refresh_rollups(
+    cursor: psycopg.Cursor, features: Sequence[str], rows: Sequence[Sequence[Any]]
+):
+    """Recomputes the intervals of the rollups touched by the history rows.
+
+    The rows have to be written to history already, in the same transaction.
+    """
+    columns = aggregates(features)
+    names = ", ".join(["symbol", "date"] + [f for f, _ in columns])
+    values = ", ".join(a for _, a in columns)
+    updates = ", ".join(f"{f} = EXCLUDED.{f}" for f, _ in columns)
+
+    for interval, table in ROLLUPS.items():
+        periods = affected_periods(rows, interval)
+        if not periods:
+            continue
+
+        symbols, starts, ends = zip(*periods)
+        cursor.execute(
+            f"""INSERT INTO {table} ({names})
+            SELECT p.symbol, p.start_date, {values}
+            FROM unnest(%s::varchar[], %s::date[], %s::date[])
+                AS p(symbol, start_date, end_date)
+            JOIN history h
+                ON h.symbol = p.symbol
+                AND h.date >= p.start_date
+                AND h.date < p.end_date
+            GROUP BY p.symbol, p.start_date
+            ON CONFLICT ({', '.join(ROLLUP_KEY)}) DO UPDATE SET {updates}""",
+            (list(symbols), list(starts), list(ends)),
+        )
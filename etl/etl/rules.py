@@ -1,6 +1,13 @@
-"""Collections of rules."""
+"""Collections of rules.
+
+Rules are evaluated on the raw values of a features event first. Most of
+the evaluations end with HOLD, so a `Decision` (with its explanation) is
+materialized only for the actionable signals, see `evaluate`. The `Rule`
+objects are shared by all the decisions.
+"""
 
 from enum import Enum
+from typing import Any, Callable, List, Mapping, NamedTuple, Sequence, Tuple
 
 from pydantic import BaseModel
 
@@ -41,6 +48,213 @@ class Decision(BaseModel):
     explanation: str
 
 
+MACD = Rule(
+    name="MACD",
+    description="Moving average convergence/divergence (MACD, or MAC-D) is a "
+    "trend-following momentum indicator that shows the relationship "
+    "between two exponential moving averages (EMAs) of a security`s price. "
+    "The MACD line is calculated by subtracting the 26-period EMA from "
+    "the 12-period EMA. The result of that calculation is the MACD line. "
+    "A nine-day EMA of the MACD line is called the signal line, which is "
+    "then plotted on top of the MACD line, which can function as a trigger "
+    "for buy or sell signals.",
+)
+
+RSI = Rule(
+    name="RSI",
+    description="The relative strength index (RSI) is a momentum indicator used in "
+    "technical analysis. RSI measures the speed and magnitude of a security's "
+    "recent price changes to evaluate overvalued or undervalued conditions in "
+    "the price of that security. RSI < 30 -> OverSold => Buy. RSI > 70 -> OverBought => Sell.",
+)
+
+ADX = Rule(
+    name="ADX",
+    description="The average directional index (ADX) is a technical analysis "
+    "indicator used by some traders to determine the strength of a trend."
+    "The ADX identifies a strong trend when the ADX is over 25 and a weak "
+    "trend when the ADX is below 20. Crossovers of the -DI and +DI lines can "
+    "be used to generate trade signals. For example, if the +DI line crosses "
+    "above the -DI line and the ADX is above 20, or ideally above 25, then "
+    "that is a potential signal to buy. On the other hand, if the -DI crosses "
+    "above the +DI, and the ADX is above 20 or 25, then that is an opportunity "
+    "to enter a potential short trade.",
+)
+
+MFI = Rule(
+    name="MFI",
+    description="Money Flow Index that begins to fall below a reading of 80 while "
+    "the underlying security continues to climb is a price reversal "
+    "signal to the downside. Conversely, a very low MFI reading that "
+    "climbs above a reading of 20 while the underlying security "
+    "continues to sell off is a price reversal signal to the upside.",
+)
+
+SWING_LOW = Rule(
+    name="Swing Low",
+    description="A stop-loss order should be placed below the swing low to close "
+    "the trade if price unexpectedly reverses.",
+)
+
+COPPOCK_CURVE = Rule(
+    name="Coppock Curve",
+    description="The zero line of the Coppock Curve acts as a trade trigger; buy "
+    "when the CC moves above zero, and sell when the CC moves below zero. "
+    "Investors can use the sell signal to close out their long positions and then "
+    "re-initiate long positions when CC crosses back above zero. Traders who wish "
+    "to be more active can close out longs and initiate short trades when the CC "
+    "crosses below zero.",
+)
+
+
+def macd_action(current_price: float, macd_value: float, signal_value: float) -> Action:
+    if macd_value <= signal_value:
+        return Action.SELL
+    return Action.BUY
+
+
+def macd_explanation(
+    current_price: float, macd_value: float, signal_value: float
+) -> str:
+    return f"Current price is {current_price:,.2f}."
+
+
+def rsi_action(current_price: float, rsi_value: float) -> Action:
+    if rsi_value < 30:
+        return Action.BUY
+    elif rsi_value > 70:
+        return Action.SELL
+    return Action.HOLD
+
+
+def rsi_explanation(current_price: float, rsi_value: float) -> str:
+    return f"Current price is {current_price:,.2f}, RSI value is {rsi_value:,.1f}."
+
+
+def adx_action(
+    current_price: float,
+    positive_di_value: float,
+    negative_di_value: float,
+    adx_value: float,
+) -> Action:
+    if adx_value > 25:
+        return Action.BUY if positive_di_value > negative_di_value else Action.SELL
+    return Action.HOLD
+
+
+def adx_explanation(
+    current_price: float,
+    positive_di_value: float,
+    negative_di_value: float,
+    adx_value: float,
+) -> str:
+    return f"Current price is {current_price:,.2f}, ADX = {adx_value:,.1f}, +DI = {positive_di_value:,.1f}, -DI = {negative_di_value:,.1f}."
+
+
+def mfi_action(
+    current_price: float, pct_change: float, mfi_value: float, mfi_delta: float
+) -> Action:
+    if mfi_value - mfi_delta > 80 and mfi_value < 80 and pct_change > 0:
+        return Action.SELL
+    elif mfi_value > 20 and mfi_value - mfi_delta < 20 and pct_change < 0:
+        return Action.BUY
+    return Action.HOLD
+
+
+def mfi_explanation(
+    current_price: float, pct_change: float, mfi_value: float, mfi_delta: float
+) -> str:
+    return f"Current price is {current_price:,.2f}, MFI value is {mfi_value:,.1f}."
+
+
+def swing_low_action(current_price: float, swing_low: float) -> Action:
+    if current_price <= swing_low:
+        return Action.SELL
+    return Action.HOLD
+
+
+def swing_low_explanation(current_price: float, swing_low: float) -> str:
+    return f"Current price is {current_price:,.2f}, MFI value is {swing_low:,.1f}."
+
+
+def coppock_curve_action(current_price: float, coppock_curve: float) -> Action:
+    if coppock_curve < 0:
+        return Action.SELL
+    return Action.BUY
+
+
+def coppock_curve_explanation(current_price: float, coppock_curve: float) -> str:
+    return f"Current price is {current_price:,.2f}, coppock curve vaue is {coppock_curve:,.2f}."
+
+
+class Check(NamedTuple):
+    """Rule evaluated on the fields of a features event."""
+
+    rule: Rule
+    # Fields of the event passed to the functions in order.
+    fields: Tuple[str, ...]
+    action: Callable[..., Action]
+    explanation: Callable[..., str]
+
+
+class Signal(NamedTuple):
+    """Action of a rule, the decision is materialized on demand."""
+
+    ticker: str
+    check: Check
+    action: Action
+    # Values of the check's fields.
+    values: Tuple[float, ...]
+
+    def decision(self) -> Decision:
+        return Decision(
+            ticker=self.ticker,
+            rule=self.check.rule,
+            action=self.action,
+            explanation=self.check.explanation(*self.values),
+        )
+
+
+CHECKS: Sequence[Check] = (
+    Check(MACD, ("close", "macd", "macd_signal"), macd_action, macd_explanation),
+    Check(ADX, ("close", "pdi", "ndi", "adx"), adx_action, adx_explanation),
+    Check(RSI, ("close", "rsi"), rsi_action, rsi_explanation),
+    Check(
+        MFI,
+        ("close", "pct_change", "money_flow_index", "mfi_delta"),
+        mfi_action,
+        mfi_explanation,
+    ),
+    Check(
+        SWING_LOW, ("close", "swing_low"), swing_low_action, swing_low_explanation
+    ),
+    Check(
+        COPPOCK_CURVE,
+        ("close", "coppock_curve"),
+        coppock_curve_action,
+        coppock_curve_explanation,
+    ),
+)
+
+
+def evaluate(
+    payload: Mapping[str, Any], checks: Sequence[Check] = CHECKS
+) -> List[Signal]:
+    """Evaluates the rules on the features event, returns the actionable signals.
+
+    Rules missing a value of the event (e.g. warming up indicators) are skipped.
+    """
+    signals = []
+    for check in checks:
+        values = tuple(payload.get(f) for f in check.fields)
+        if None in values:
+            continue
+        action = check.action(*values)
+        if action != Action.HOLD:
+            signals.append(Signal(payload["symbol"], check, action, values))
+    return signals
+
+
 def macd_rule(
     ticker: str, current_price: float, macd_value: float, signal_value: float
 ) -> Decision:
@@ -48,50 +262,14 @@ def macd_rule(
 
     https://www.investopedia.com/terms/m/macd.asp
     """
-
-    rule = Rule(
-        name="MACD",
-        description="Moving average convergence/divergence (MACD, or MAC-D) is a "
-        "trend-following momentum indicator that shows the relationship "
-        "between two exponential moving averages (EMAs) of a security`s price. "
-        "The MACD line is calculated by subtracting the 26-period EMA from "
-        "the 12-period EMA. The result of that calculation is the MACD line. "
-        "A nine-day EMA of the MACD line is called the signal line, which is "
-        "then plotted on top of the MACD line, which can function as a trigger "
-        "for buy or sell signals.",
-    )
-
-    decision_action = Action.BUY
-    if macd_value <= signal_value:
-        decision_action = Action.SELL
-
-    exp_msg = f"Current price is {current_price:,.2f}."
-    return Decision(
-        ticker=ticker, rule=rule, action=decision_action, explanation=exp_msg
-    )
+    values = (current_price, macd_value, signal_value)
+    return Signal(ticker, CHECKS[0], macd_action(*values), values).decision()
 
 
 def rsi_rule(ticker: str, current_price: float, rsi_value: float) -> Decision:
     """RSI rule."""
-
-    rule = Rule(
-        name="RSI",
-        description="The relative strength index (RSI) is a momentum indicator used in "
-        "technical analysis. RSI measures the speed and magnitude of a security's "
-        "recent price changes to evaluate overvalued or undervalued conditions in "
-        "the price of that security. RSI < 30 -> OverSold => Buy. RSI > 70 -> OverBought => Sell.",
-    )
-
-    decision_action = Action.HOLD
-    if rsi_value < 30:
-        decision_action = Action.BUY
-    elif rsi_value > 70:
-        decision_action = Action.SELL
-
-    exp_msg = f"Current price is {current_price:,.2f}, RSI value is {rsi_value:,.1f}."
-    return Decision(
-        ticker=ticker, rule=rule, action=decision_action, explanation=exp_msg
-    )
+    values = (current_price, rsi_value)
+    return Signal(ticker, CHECKS[2], rsi_action(*values), values).decision()
 
 
 def adx_rule(
@@ -102,30 +280,8 @@ def adx_rule(
     adx_value: float,
 ) -> Decision:
     """ADX rule."""
-
-    rule = Rule(
-        name="ADX",
-        description="The average directional index (ADX) is a technical analysis "
-        "indicator used by some traders to determine the strength of a trend."
-        "The ADX identifies a strong trend when the ADX is over 25 and a weak "
-        "trend when the ADX is below 20. Crossovers of the -DI and +DI lines can "
-        "be used to generate trade signals. For example, if the +DI line crosses "
-        "above the -DI line and the ADX is above 20, or ideally above 25, then "
-        "that is a potential signal to buy. On the other hand, if the -DI crosses "
-        "above the +DI, and the ADX is above 20 or 25, then that is an opportunity "
-        "to enter a potential short trade.",
-    )
-
-    decision_action = Action.HOLD
-    if adx_value > 25:
-        decision_action = (
-            Action.BUY if positive_di_value > negative_di_value else Action.SELL
-        )
-
-    exp_msg = f"Current price is {current_price:,.2f}, ADX = {adx_value:,.1f}, +DI = {positive_di_value:,.1f}, -DI = {negative_di_value:,.1f}."
-    return Decision(
-        ticker=ticker, rule=rule, action=decision_action, explanation=exp_msg
-    )
+    values = (current_price, positive_di_value, negative_di_value, adx_value)
+    return Signal(ticker, CHECKS[1], adx_action(*values), values).decision()
 
 
 def mfi_rule(
@@ -136,67 +292,19 @@ def mfi_rule(
     mfi_delta: float,
 ) -> Decision:
     """MFI rule."""
-
-    rule = Rule(
-        name="MFI",
-        description="Money Flow Index that begins to fall below a reading of 80 while "
-        "the underlying security continues to climb is a price reversal "
-        "signal to the downside. Conversely, a very low MFI reading that "
-        "climbs above a reading of 20 while the underlying security "
-        "continues to sell off is a price reversal signal to the upside.",
-    )
-
-    decision_action = Action.HOLD
-    if mfi_value - mfi_delta > 80 and mfi_value < 80 and pct_change > 0:
-        decision_action = Action.SELL
-    elif mfi_value > 20 and mfi_value - mfi_delta < 20 and pct_change < 0:
-        decision_action = Action.BUY
-
-    exp_msg = f"Current price is {current_price:,.2f}, MFI value is {mfi_value:,.1f}."
-    return Decision(
-        ticker=ticker, rule=rule, action=decision_action, explanation=exp_msg
-    )
+    values = (current_price, pct_change, mfi_value, mfi_delta)
+    return Signal(ticker, CHECKS[3], mfi_action(*values), values).decision()
 
 
 def swing_low_rule(ticker: str, current_price: float, swing_low: float) -> Decision:
     """Swing Low rule."""
-
-    rule = Rule(
-        name="Swing Low",
-        description="A stop-loss order should be placed below the swing low to close "
-        "the trade if price unexpectedly reverses.",
-    )
-
-    decision_action = Action.HOLD
-    if current_price <= swing_low:
-        decision_action = Action.SELL
-
-    exp_msg = f"Current price is {current_price:,.2f}, MFI value is {swing_low:,.1f}."
-    return Decision(
-        ticker=ticker, rule=rule, action=decision_action, explanation=exp_msg
-    )
+    values = (current_price, swing_low)
+    return Signal(ticker, CHECKS[4], swing_low_action(*values), values).decision()
 
 
 def coppock_curve_rule(
     ticker: str, current_price: float, coppock_curve: float
 ) -> Decision:
     """Coppock Curve rule."""
-
-    rule = Rule(
-        name="Coppock Curve",
-        description="The zero line of the Coppock Curve acts as a trade trigger; buy "
-        "when the CC moves above zero, and sell when the CC moves below zero. "
-        "Investors can use the sell signal to close out their long positions and then "
-        "re-initiate long positions when CC crosses back above zero. Traders who wish "
-        "to be more active can close out longs and initiate short trades when the CC "
-        "crosses below zero.",
-    )
-
-    decision_action = Action.BUY
-    if coppock_curve < 0:
-        decision_action = Action.SELL
-
-    exp_msg = f"Current price is {current_price:,.2f}, coppock curve vaue is {coppock_curve:,.2f}."
-    return Decision(
-        ticker=ticker, rule=rule, action=decision_action, explanation=exp_msg
-    )
+    values = (current_price, coppock_curve)
+    return Signal(ticker, CHECKS[5], coppock_curve_action(*values), values).decision()
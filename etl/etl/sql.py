@@ -0,0 +1,248 @@
+"""Bulk writes of the sinks' rows to Postgres.
+
+Rows are written with the binary COPY by default, which is several times
+faster than INSERT for big batches. COPY needs values of the exact column
+types, dates are `datetime.date`, integers are `int`. When the COPY fails, the
+batch is written again with INSERT.
+
+Tables with a natural key are upserted, so replayed events update the rows
+instead of duplicating them. The rows are copied into a temporary staging
+table first and merged from it with INSERT ... ON CONFLICT DO UPDATE.
+
+Rows of several tables can be written in one transaction with
+`write_tables`, so derived tables never disagree with the source one.
+"""
+import logging
+from datetime import date, datetime
+from typing import Any, Callable, List, NamedTuple, Sequence, Tuple
+
+import psycopg
+
+WRITE_MODES = ["copy", "insert"]
+
+# Name and Postgres type of a column.
+Column = Tuple[str, str]
+
+
+class TableRows(NamedTuple):
+    table: str
+    columns: Sequence[Column]
+    rows: Sequence[Sequence[Any]]
+    # The natural key of the table, the rows are upserted when given.
+    key: Sequence[str] = ()
+    # Condition of updating the existing row of the key, e.g. a newer date.
+    where: str = ""
+
+
+def to_date(value: Any) -> date | None:
+    """Converts the date of an event, e.g. an ISO timestamp or 10/17/2023."""
+    if value is None or isinstance(value, date):
+        return value
+    text = str(value)
+    try:
+        return date.fromisoformat(text[:10])
+    except ValueError:
+        return datetime.strptime(text.split()[0], "%m/%d/%Y").date()
+
+
+def unique_rows(
+    columns: Sequence[Column], rows: Sequence[Sequence[Any]], key: Sequence[str]
+) -> List[Sequence[Any]]:
+    """Drops the rows with the same key but the last one.
+
+    An upsert can't update the same row twice in one statement.
+    """
+    names = [name for name, _ in columns]
+    indices = [names.index(k) for k in key]
+    return list({tuple(row[i] for i in indices): row for row in rows}.values())
+
+
+def on_conflict(columns: Sequence[Column], key: Sequence[str], where: str = "") -> str:
+    updates = ", ".join(
+        f"{name} = EXCLUDED.{name}" for name, _ in columns if name not in key
+    )
+    statement = f"ON CONFLICT ({', '.join(key)}) DO UPDATE SET {updates}"
+    if where:
+        statement += f" WHERE {where}"
+    return statement
+
+
+def lock_table_schema(cursor: psycopg.Cursor, table: str):
+    """Serializes the schema changes of the sinks of all the workers.
+
+    The lock is held until the end of the transaction.
+    """
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (table,))
+
+
+def dedupe_table(cursor: psycopg.Cursor, table: str, key: Sequence[str], index: str):
+    """Deletes the duplicates of the key, then creates the unique index of it.
+
+    The rows written last (with the greatest record_id) are kept. Does
+    nothing once the index exists.
+    """
+    cursor.execute("SELECT to_regclass(%s)", (index,))
+    if cursor.fetchone()[0] is not None:
+        return
+
+    same_key = " AND ".join(f"a.{k} = b.{k}" for k in key)
+    cursor.execute(
+        f"""DELETE FROM {table} a USING {table} b
+        WHERE {same_key} AND a.record_id < b.record_id"""
+    )
+    cursor.execute(f"CREATE UNIQUE INDEX {index} ON {table} ({', '.join(key)})")
+
+
+def set_column_types(cursor: psycopg.Cursor, table: str, columns: Sequence[Column]):
+    """Changes the types of the existing columns which differ.
+
+    Rewrites the table, does nothing when all the types match.
+    """
+    cursor.execute(
+        """SELECT column_name, data_type FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s""",
+        (table,),
+    )
+    current = dict(cursor.fetchall())
+    changes = [
+        f"ALTER COLUMN {name} TYPE {type_}"
+        for name, type_ in columns
+        if name in current and current[name] != type_
+    ]
+    if changes:
+        cursor.execute(f"ALTER TABLE {table} {', '.join(changes)}")
+
+
+def copy_rows(
+    cursor: psycopg.Cursor,
+    table: str,
+    columns: Sequence[Column],
+    rows: Sequence[Sequence[Any]],
+):
+    names = ", ".join(name for name, _ in columns)
+    with cursor.copy(f"COPY {table} ({names}) FROM STDIN (FORMAT BINARY)") as copy:
+        copy.set_types([type_ for _, type_ in columns])
+        for row in rows:
+            copy.write_row(row)
+
+
+def upsert_rows(
+    cursor: psycopg.Cursor,
+    table: str,
+    columns: Sequence[Column],
+    rows: Sequence[Sequence[Any]],
+    key: Sequence[str],
+    where: str = "",
+):
+    staging = f"{table}_staging"
+    schema = ", ".join(f"{name} {type_}" for name, type_ in columns)
+    cursor.execute(
+        f"CREATE TEMPORARY TABLE IF NOT EXISTS {staging} ({schema}) "
+        "ON COMMIT DELETE ROWS"
+    )
+    copy_rows(cursor, staging, columns, rows)
+
+    names = ", ".join(name for name, _ in columns)
+    cursor.execute(
+        f"""INSERT INTO {table} ({names})
+        SELECT {names} FROM {staging}
+        {on_conflict(columns, key, where)}"""
+    )
+
+
+def insert_rows(
+    cursor: psycopg.Cursor,
+    table: str,
+    columns: Sequence[Column],
+    rows: Sequence[Sequence[Any]],
+    key: Sequence[str] = (),
+    where: str = "",
+):
+    names = ", ".join(name for name, _ in columns)
+    values = ", ".join(["%s"] * len(columns))
+    statement = f"INSERT INTO {table} ({names}) VALUES ({values})"
+    if key:
+        statement += f" {on_conflict(columns, key, where)}"
+    cursor.executemany(statement, rows)
+
+
+def write_rows(
+    connection: psycopg.Connection,
+    mode: str,
+    table: str,
+    columns: Sequence[Column],
+    rows: Sequence[Sequence[Any]],
+    logger: logging.Logger,
+    key: Sequence[str] = (),
+):
+    """Writes the rows in one transaction.
+
+    Args:
+      connection - the connection to the db.
+      mode - `copy` or `insert`, a failed COPY falls back to INSERT.
+      table - the name of the table.
+      columns - the names and the types of the columns in the order of the values.
+      rows - the values of the rows.
+      logger - the logger of the sink.
+      key - the natural key of the table, the rows are upserted when given.
+    """
+    write_tables(connection, mode, [TableRows(table, columns, rows, key)], logger)
+
+
+def write_tables(
+    connection: psycopg.Connection,
+    mode: str,
+    tables: Sequence[TableRows],
+    logger: logging.Logger,
+    after: Callable[[psycopg.Cursor], None] | None = None,
+):
+    """Writes the rows of the tables in one transaction, in the given order.
+
+    Args:
+      connection - the connection to the db.
+      mode - `copy` or `insert`, a failed COPY falls back to INSERT.
+      tables - the rows of every table.
+      logger - the logger of the sink.
+      after - optional statements run after the writes in the same transaction.
+    """
+    tables = [
+        t._replace(rows=unique_rows(t.columns, t.rows, t.key)) if t.key else t
+        for t in tables
+    ]
+    names = ", ".join(t.table for t in tables)
+
+    if mode == "copy":
+        try:
+            with connection.cursor() as cursor:
+                for t in tables:
+                    if t.key:
+                        upsert_rows(cursor, t.table, t.columns, t.rows, t.key, t.where)
+                    else:
+                        copy_rows(cursor, t.table, t.columns, t.rows)
+                if after is not None:
+                    after(cursor)
+            connection.commit()
+            return
+        except psycopg.OperationalError:
+            # The connection is lost, INSERT would fail the same way.
+            raise
+        except psycopg.Error as e:
+            connection.rollback()
+            logger.warning(f"COPY into {names} failed, falling back to INSERT: {e}")
+
+    with connection.cursor() as cursor:
+        for t in tables:
+            try:
+                insert_rows(cursor, t.table, t.columns, t.rows, t.key, t.where)
+            except Exception as e:
+                logger.exception("Failed to insert %s", t.rows)
+
+                raise e from None
+        if after is not None:
+            after(cursor)
+    try:
+        connection.commit()
+    except Exception as e:
+        logger.exception("Failed to commit.")
+
+        raise e from None
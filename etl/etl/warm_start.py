@@ -0,0 +1,151 @@
+"""Warm start of the indicators' state.
+
+Without the recovery state the features flow would have to replay the whole
+`events` topic before the averages and the lookback windows are right. The
+state of a symbol is reconstructed instead from its latest bars in the
+`history` table by the vectorized indicators, or loaded from a snapshot file
+made the same way earlier.
+
+Usage:
+    python -m etl.warm_start seeds.pickle
+
+writes the snapshot of the history table, the database and the feature set
+are configured by the same POSTGRES_* and INDICATORS environment variables
+as the flows.
+"""
+import logging
+import os
+import pickle
+from argparse import ArgumentParser
+from datetime import date
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+import psycopg
+
+from etl.math import PRICE_FIELDS, Indicators, IndicatorsState
+
+# The averages forget the bars before them, the slowest one (alpha = 2 / 221)
+# keeps less than 1e-5 of their weight.
+DEFAULT_BARS = 1500
+
+HISTORY_QUERY = """
+    SELECT symbol, date, open, high, low, close, volume
+    FROM (
+        SELECT
+            *,
+            row_number() OVER (PARTITION BY symbol ORDER BY date DESC) AS age
+        FROM (
+            SELECT DISTINCT ON (symbol, date)
+                symbol, date, open, high, low, close, volume
+            FROM history
+            WHERE date IS NOT NULL AND close IS NOT NULL
+            ORDER BY symbol, date, record_id DESC
+        ) AS bars
+    ) AS recent
+    WHERE age <= %(bars)s
+    ORDER BY symbol, date
+"""
+
+Row = Tuple[str, date, float, float, float, float, float]
+
+
+def seeds_from_rows(
+    indicators: Indicators, rows: Iterable[Row]
+) -> Dict[str, IndicatorsState]:
+    """Calculates the states of the symbols after their bars.
+
+    Args:
+      indicators - the indicators of the flow.
+      rows - the bars as (symbol, date, open, high, low, close, volume),
+        ordered by symbol and date.
+
+    Returns:
+      the state of every symbol.
+    """
+    seeds = {}
+    for symbol, bars in groupby(rows, key=itemgetter(0)):
+        bars = list(bars)
+        values = np.array([bar[2:] for bar in bars], dtype=float)
+        columns = {field: values[:, i] for i, field in enumerate(PRICE_FIELDS)}
+
+        states = [indicator.builder() for indicator in indicators.indicators]
+        seeds[symbol] = IndicatorsState(
+            states=indicators.vectorized(states, columns),
+            specs=indicators.specs,
+            seeded_until=bars[-1][1],
+        )
+    return seeds
+
+
+def load_history_seeds(
+    conn_info: str, indicators: Indicators, bars: int = DEFAULT_BARS
+) -> Dict[str, IndicatorsState]:
+    """Calculates the states of the symbols from their latest bars in the db."""
+    with psycopg.connect(conn_info) as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(HISTORY_QUERY, {"bars": bars})
+            return seeds_from_rows(indicators, cursor)
+
+
+def save_snapshot(path: str, seeds: Dict[str, IndicatorsState]):
+    with open(path, "wb") as f:
+        pickle.dump(seeds, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_snapshot(path: str) -> Dict[str, IndicatorsState]:
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def load_seeds(
+    source: str, indicators: Indicators, conn_info: str | None = None
+) -> Dict[str, IndicatorsState]:
+    """Loads the seeds from the source.
+
+    Args:
+      source - `history` for the history table, otherwise the path to a snapshot.
+      indicators - the indicators of the flow.
+      conn_info - the connection string of the db with the history table.
+
+    Returns:
+      the state of every known symbol.
+    """
+    if source == "history":
+        return load_history_seeds(conn_info, indicators)
+    return load_snapshot(source)
+
+
+def main():
+    from etl.features import fused_indicators
+    from etl.registry import DEFAULT_INDICATORS
+
+    parser = ArgumentParser(description="Snapshots the indicators' state.")
+    parser.add_argument("output", help="Specify the path of the snapshot.")
+    parser.add_argument(
+        "--bars",
+        type=int,
+        help="Specify the number of the latest bars of a symbol to use.",
+        default=DEFAULT_BARS,
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger("etl.warm_start")
+
+    conn_info = (
+        f"postgresql://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}"
+        f"@{os.getenv('POSTGRES_HOST')}:5432/{os.getenv('POSTGRES_DB')}"
+    )
+    indicators = fused_indicators(
+        config=os.getenv("INDICATORS") or DEFAULT_INDICATORS
+    )
+    seeds = load_history_seeds(conn_info, indicators, bars=args.bars)
+    save_snapshot(args.output, seeds)
+    logger.info(f"Saved the state of {len(seeds)} symbols to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
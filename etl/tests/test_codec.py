@@ -0,0 +1,65 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import etl.codec
+from etl.codec import SCHEMAS, decode, encode
+
+MONOREPO = Path(__file__).resolve().parents[2]
+
+FEATURES = {
+    "symbol": "AAPL",
+    "date": "2023-10-20T00:00:00-04:00",
+    "open": 1.0,
+    "high": 2.0,
+    "low": 0.5,
+    "close": 1.5,
+    "volume": 1000.0,
+    "dividends": 0.0,
+    "kind": "TICKER_PRICE",
+    **{field: i / 7.0 for i, field in enumerate(SCHEMAS[2][8:])},
+}
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        FEATURES,
+        {k: v for k, v in FEATURES.items() if k != "coppock_curve"},
+        {**FEATURES, "new_indicator": 42.0},
+        {"kind": "UNKNOWN", "value": 1},
+    ],
+)
+@pytest.mark.parametrize("encoding", ["json", "binary"])
+def test_round_trip(payload, encoding):
+    assert decode(encode(payload, encoding)) == payload
+
+
+def test_binary_is_compact():
+    assert len(encode(FEATURES, "binary")) < len(json.dumps(FEATURES)) / 2
+
+
+def test_decode_legacy_json():
+    assert decode(json.dumps(FEATURES).encode("utf-8")) == FEATURES
+
+
+def test_encode_numpy_scalars():
+    payload = {"kind": "UNKNOWN", "code": np.int64(7), "value": np.float64(0.5)}
+
+    assert decode(encode(payload, "binary")) == {**payload, "code": 7}
+
+
+@pytest.mark.parametrize(
+    "copy",
+    ["yfinance-client/yfinance_client/codec.py", "cot-client/cot_client/codec.py"],
+)
+def test_producers_codecs_are_copies(copy):
+    path = MONOREPO / copy
+    if not path.parent.is_dir():
+        pytest.skip(f"{path.parent} is not checked out")
+
+    assert path.read_text() == Path(etl.codec.__file__).read_text(), (
+        f"{copy} diverged from etl/etl/codec.py, run `make sync-codec`"
+    )
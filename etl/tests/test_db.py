@@ -0,0 +1,57 @@
+import logging
+from contextlib import contextmanager
+
+import psycopg
+import pytest
+
+from etl.db import with_retries
+
+
+class FakePool:
+    def __init__(self):
+        self.lent = 0
+
+    @contextmanager
+    def connection(self):
+        self.lent += 1
+        yield f"connection {self.lent}"
+
+
+def flaky(failures, error=psycopg.OperationalError):
+    calls = []
+
+    def work(connection):
+        calls.append(connection)
+        if len(calls) <= failures:
+            raise error("server closed the connection unexpectedly")
+        return connection
+
+    return work, calls
+
+
+def test_transient_errors_are_retried_with_a_fresh_connection():
+    pool = FakePool()
+    work, calls = flaky(failures=2)
+
+    result = with_retries(pool, work, logging.getLogger("test"), backoff=0)
+
+    assert result == "connection 3"
+    assert calls == ["connection 1", "connection 2", "connection 3"]
+
+
+def test_retries_are_limited():
+    work, calls = flaky(failures=10)
+
+    with pytest.raises(psycopg.OperationalError):
+        with_retries(FakePool(), work, logging.getLogger("test"), retries=2, backoff=0)
+
+    assert len(calls) == 3
+
+
+def test_other_errors_are_not_retried():
+    work, calls = flaky(failures=1, error=psycopg.errors.UndefinedColumn)
+
+    with pytest.raises(psycopg.errors.UndefinedColumn):
+        with_retries(FakePool(), work, logging.getLogger("test"), backoff=0)
+
+    assert len(calls) == 1
@@ -0,0 +1,99 @@
+from functools import partial
+from random import Random
+
+import pytest
+
+from bytewax.dataflow import Dataflow
+from bytewax.testing import TestingInput, TestingOutput, cluster_main, run_main
+
+from etl.features import indicators
+from etl.math import (
+    MA,
+    MACD,
+    MFI,
+    RSI,
+    AverageDirectionalIndex,
+    AverageTrueRange,
+    CoppockCurve,
+    SwingLow,
+)
+
+
+def synthetic_events(symbols: int = 5, bars: int = 400):
+    rng = Random(0)
+    closes = {f"SYM{i}": 100.0 for i in range(symbols)}
+    for day in range(bars):
+        for symbol in closes:
+            close = max(1.0, closes[symbol] + rng.gauss(0.0, 1.0))
+            closes[symbol] = close
+            yield symbol, {
+                "symbol": symbol,
+                "date": day,
+                "open": close,
+                "high": close + rng.random(),
+                "low": close - rng.random(),
+                "close": close,
+                "volume": float(rng.randrange(1_000, 100_000)),
+                "dividends": 0.0,
+                "kind": "TICKER_PRICE",
+            }
+
+
+def chained_indicators(flow: Dataflow):
+    AverageTrueRange(p=14)(flow)
+    AverageDirectionalIndex(p=14)(flow)
+    MACD()(flow)
+    RSI()(flow)
+    MA(window=50)(flow)
+    MA(window=200)(flow)
+    MFI()(flow)
+    SwingLow()(flow)
+    CoppockCurve()(flow)
+
+
+def calculate(worker_count: int, steps=indicators):
+    flow = Dataflow()
+    flow.input("events", TestingInput(list(synthetic_events())))
+    steps(flow)
+    out = []
+    flow.output("out", TestingOutput(out))
+
+    if worker_count == 1:
+        run_main(flow)
+    else:
+        cluster_main(flow, [], 0, worker_count_per_proc=worker_count)
+
+    per_symbol = {}
+    for symbol, payload in out:
+        per_symbol.setdefault(symbol, []).append(payload)
+    return per_symbol
+
+
+def test_indicators_with_many_workers():
+    expected = calculate(worker_count=1)
+    actual = calculate(worker_count=3)
+
+    assert expected.keys() == actual.keys()
+    for symbol, payloads in expected.items():
+        assert [p["date"] for p in actual[symbol]] == list(range(400))
+        assert actual[symbol] == payloads
+
+
+def test_fused_indicators_match_chained_steps():
+    expected = calculate(worker_count=1, steps=chained_indicators)
+    actual = calculate(worker_count=1)
+
+    assert actual == expected
+
+
+def test_backfill_mode_matches_streaming():
+    expected = calculate(worker_count=1)
+    actual = calculate(
+        worker_count=2, steps=partial(indicators, backfill_batch_size=100)
+    )
+
+    assert expected.keys() == actual.keys()
+    for symbol, payloads in expected.items():
+        assert len(actual[symbol]) == len(payloads)
+        for a, e in zip(actual[symbol], payloads):
+            assert a == pytest.approx(e, rel=1e-9, abs=1e-9)
@@ -0,0 +1,140 @@
+import os
+from datetime import date
+
+import pyarrow.parquet as pq
+from bytewax.dataflow import Dataflow
+from bytewax.testing import TestingInput, run_main
+
+from etl.lake import (
+    arrow_schema,
+    partition_dir,
+    partition_files,
+    read_symbol,
+    write_partitions,
+)
+from etl.lake_consumers import LakeOutput
+
+COLUMNS = [
+    ("symbol", "varchar"),
+    ("date", "date"),
+    ("close", "double precision"),
+    ("volume", "bigint"),
+]
+
+
+def test_rows_are_written_to_their_partitions(tmp_path):
+    rows = [
+        ("AAPL", date(2022, 12, 30), 129.93, 77034200),
+        ("AAPL", date(2023, 1, 3), 125.07, 112117500),
+        ("MSFT", date(2023, 1, 3), 239.58, 25740000),
+        ("MSFT", None, 1.0, 1),
+    ]
+
+    paths = write_partitions(str(tmp_path), COLUMNS, rows)
+
+    assert [os.path.relpath(os.path.dirname(p), tmp_path) for p in paths] == [
+        os.path.join("symbol=AAPL", "year=2022"),
+        os.path.join("symbol=AAPL", "year=2023"),
+        os.path.join("symbol=MSFT", "year=2023"),
+    ]
+    table = pq.read_table(paths[1])
+    assert table.to_pylist() == [
+        {
+            "symbol": "AAPL",
+            "date": date(2023, 1, 3),
+            "close": 125.07,
+            "volume": 112117500,
+        }
+    ]
+
+
+def test_partitions_are_compacted_keeping_the_latest_bars(tmp_path):
+    root = str(tmp_path)
+    for i in range(5):
+        rows = [
+            ("AAPL", date(2023, 1, 2 + i), float(i), i),
+            # Rewritten by every batch, e.g. a replayed event.
+            ("AAPL", date(2023, 1, 2), float(i), i),
+        ]
+        write_partitions(root, COLUMNS, rows, max_files=3)
+
+    assert len(partition_files(partition_dir(root, "AAPL", 2023))) <= 3
+    table = read_symbol(root, "AAPL")
+    assert table["date"].to_pylist() == [date(2023, 1, 2 + i) for i in range(5)]
+    assert table["close"].to_pylist() == [4.0, 1.0, 2.0, 3.0, 4.0]
+
+
+def test_partitions_mixing_storages(tmp_path):
+    root = str(tmp_path)
+    real_columns = [("symbol", "varchar"), ("date", "date"), ("close", "real")]
+    for i in range(3):
+        rows = [("AAPL", date(2023, 1, 2 + i), 0.5 + i)]
+        write_partitions(root, real_columns, rows, max_files=3)
+    assert read_symbol(root, "AAPL")["close"].to_pylist() == [0.5, 1.5, 2.5]
+
+    # The storage is switched to double, a file triggers the compaction.
+    write_partitions(root, COLUMNS, [("AAPL", date(2023, 1, 2), 0.1, 7)], max_files=3)
+
+    (path,) = partition_files(partition_dir(root, "AAPL", 2023))
+    assert pq.read_schema(path) == arrow_schema(COLUMNS)
+    table = read_symbol(root, "AAPL")
+    assert table["close"].to_pylist() == [0.1, 1.5, 2.5]
+    assert table["volume"].to_pylist() == [7, None, None]
+
+
+def test_read_symbol_range_and_columns(tmp_path):
+    root = str(tmp_path)
+    rows = [
+        ("AAPL", date(2022, 12, 29), 1.0, 1),
+        ("AAPL", date(2022, 12, 30), 2.0, 2),
+        ("AAPL", date(2023, 1, 3), 3.0, 3),
+        ("AAPL", date(2023, 1, 4), 4.0, 4),
+    ]
+    write_partitions(root, COLUMNS, rows)
+
+    table = read_symbol(
+        root, "AAPL", start=date(2022, 12, 30), end=date(2023, 1, 4), columns=["close"]
+    )
+
+    assert table.column_names == ["date", "close"]
+    assert table.to_pylist() == [
+        {"date": date(2022, 12, 30), "close": 2.0},
+        {"date": date(2023, 1, 3), "close": 3.0},
+    ]
+    assert read_symbol(root, "MSFT").num_rows == 0
+
+
+def test_lake_output(tmp_path):
+    events = [
+        (
+            "AAPL",
+            [
+                {"symbol": "AAPL", "date": "2023-01-03T00:00:00-05:00", "close": 1.5},
+                {"symbol": "AAPL", "date": "2023-01-04T00:00:00-05:00", "close": 2.5},
+            ],
+        )
+    ]
+    flow = Dataflow()
+    flow.input("inp", TestingInput(events))
+    flow.output("out", LakeOutput(str(tmp_path), features=["close"]))
+
+    run_main(flow)
+
+    assert read_symbol(str(tmp_path), "AAPL").to_pylist() == [
+        {"symbol": "AAPL", "date": date(2023, 1, 3), "close": 1.5},
+        {"symbol": "AAPL", "date": date(2023, 1, 4), "close": 2.5},
+    ]
+
+
+def test_lake_output_with_missing_volume(tmp_path):
+    bar = {"symbol": "AAPL", "date": "2023-01-03", "close": 1.5}
+    events = [("AAPL", [{**bar, "volume": float("nan")}])]
+    flow = Dataflow()
+    flow.input("inp", TestingInput(events))
+    flow.output("out", LakeOutput(str(tmp_path), features=["close", "volume"]))
+
+    run_main(flow)
+
+    assert read_symbol(str(tmp_path), "AAPL").to_pylist() == [
+        {"symbol": "AAPL", "date": date(2023, 1, 3), "close": 1.5, "volume": None}
+    ]
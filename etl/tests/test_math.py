@@ -0,0 +1,38 @@
+import pickle
+from random import Random
+
+import pytest
+
+from etl.math import RingBuffer, RollingMax, RollingMin
+
+
+def test_rolling_extremums():
+    rng = Random(0)
+    values = [float(rng.randrange(10)) for _ in range(200)]
+    window = 7
+
+    rolling_min = RollingMin(window)
+    rolling_max = RollingMax(window)
+    for i, value in enumerate(values):
+        last = values[max(0, i - window + 1) : i + 1]
+        assert rolling_min.push(value) == min(last)
+        assert rolling_max.push(value) == max(last)
+        assert len(rolling_min.values) <= window
+        assert len(rolling_max.values) <= window
+
+
+def test_ring_buffer():
+    buffer = RingBuffer(3)
+    for value in range(5):
+        buffer.append(float(value))
+
+    assert len(buffer) == 3
+    assert list(buffer) == [2.0, 3.0, 4.0]
+    assert buffer[0] == buffer[-3] == 2.0
+    assert buffer[-1] == 4.0
+    with pytest.raises(IndexError):
+        buffer[-4]
+
+    restored = pickle.loads(pickle.dumps(buffer))
+    restored.append(5.0)
+    assert list(restored) == [3.0, 4.0, 5.0]
@@ -0,0 +1,87 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from bytewax.dataflow import Dataflow
+from bytewax.testing import TestingInput, TestingOutput, run_main
+
+from etl.monitor import RuleTransitions
+from etl.notifyer import load_last_actions
+from etl.rules import RSI, Action, evaluate
+
+
+def rsi_signals(symbol, *values, days_ago=None):
+    """Signals of the daily bars of the symbol ending yesterday, or earlier."""
+    if days_ago is None:
+        days_ago = len(values)
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0)
+    events = []
+    for i, v in enumerate(values):
+        date = (today - timedelta(days=days_ago - i)).isoformat()
+        payload = {"symbol": symbol, "date": date, "close": 1.0, "rsi": v}
+        events.append((symbol, (date, evaluate(payload))))
+    return events
+
+
+def transitions(events, seeds=None, horizon=None):
+    flow = Dataflow()
+    flow.input("inp", TestingInput(events))
+    RuleTransitions(seeds, horizon)(flow)
+    out = []
+    flow.output("out", TestingOutput(out))
+
+    run_main(flow)
+    return [
+        (symbol, signal.check.rule.name, signal.action)
+        for symbol, signals in out
+        for signal in signals
+    ]
+
+
+def test_only_changes_of_the_actions_are_emitted():
+    events = rsi_signals("AAPL", 20, 25, 50, 20, 80, 90, 20) + rsi_signals("MSFT", 20)
+
+    assert transitions(events) == [
+        ("AAPL", "RSI", Action.BUY),
+        ("AAPL", "RSI", Action.SELL),
+        ("AAPL", "RSI", Action.BUY),
+        ("MSFT", "RSI", Action.BUY),
+    ]
+
+
+def test_state_is_seeded_with_the_last_actions():
+    events = rsi_signals("AAPL", 20, 80)
+
+    assert transitions(events, seeds={"AAPL": {RSI.name: Action.BUY}}) == [
+        ("AAPL", "RSI", Action.SELL),
+    ]
+
+
+def test_legacy_last_actions(tmp_path):
+    resource = tmp_path / ".notifyer.json"
+    resource.write_text(
+        json.dumps({"dbihbka": {"AAPL": {"RSI": "buy", "MACD": "sell", "ADX": None}}})
+    )
+
+    assert load_last_actions(resource, "dbihbka") == {
+        "AAPL": {"RSI": Action.BUY, "MACD": Action.SELL}
+    }
+    assert load_last_actions(tmp_path / "missing.json", "dbihbka") == {}
+
+
+def test_bars_older_than_the_horizon_only_warm_the_state_up():
+    # BUY and SELL 10 and 9 days ago, SELL, BUY and SELL in the last 3 days.
+    events = rsi_signals("AAPL", 20, 80, days_ago=10) + rsi_signals("AAPL", 80, 20, 80)
+
+    assert transitions(events, horizon=timedelta(days=4)) == [
+        ("AAPL", "RSI", Action.BUY),
+        ("AAPL", "RSI", Action.SELL),
+    ]
+
+
+def test_replayed_bars_are_skipped():
+    events = rsi_signals("AAPL", 20, 80)
+
+    assert transitions(events + events) == [
+        ("AAPL", "RSI", Action.BUY),
+        ("AAPL", "RSI", Action.SELL),
+    ]
@@ -0,0 +1,83 @@
+import copy
+
+import pytest
+
+from etl.features import fused_indicators
+from etl.registry import DEFAULT_INDICATORS, history_fields, parse_indicators
+from tests.test_vectorized import synthetic_bars
+
+
+def calculate(indicators, events, state=None):
+    out = []
+    for event in copy.deepcopy(events):
+        state, event = indicators.mapper(state, event)
+        out.append(event)
+    return state, out
+
+
+def test_default_feature_set():
+    indicators = parse_indicators(DEFAULT_INDICATORS)
+
+    assert [i.spec for i in indicators][4:6] == ["MA(window=50)", "MA(window=200)"]
+    assert set(history_fields(indicators)) == {
+        "open",
+        "high",
+        "low",
+        "close",
+        "volume",
+        "pdi",
+        "ndi",
+        "adx",
+        "macd",
+        "macd_signal",
+        "rsi",
+        "dividends",
+        "moving_average_50",
+        "moving_average_200",
+        "money_flow_index",
+        "swing_low",
+        "coppock_curve",
+    }
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        "Unknown()",
+        "MA(window=50), 42",
+        "AverageDirectionalIndex(p=14)",
+        "MA(window=",
+    ],
+)
+def test_invalid_feature_sets(config):
+    with pytest.raises(ValueError):
+        parse_indicators(config)
+
+
+def test_only_configured_indicators_are_calculated():
+    events = list(synthetic_bars(10))
+    _, out = calculate(fused_indicators(config="MA(window=20), RSI()"), events)
+
+    assert set(out[-1]) == set(events[-1]) | {
+        "moving_average_20",
+        "pct_change",
+        "gain_ma",
+        "loss_ma",
+        "rsi",
+    }
+
+
+def test_states_carry_over_a_feature_set_change():
+    events = list(synthetic_bars(300))
+    _, expected = calculate(fused_indicators(config="MA(window=50), RSI()"), events)
+
+    state, _ = calculate(fused_indicators(config="RSI(), MA(window=50)"), events[:200])
+    _, actual = calculate(
+        fused_indicators(config="MA(window=50), MA(window=20), RSI()"),
+        events[200:],
+        state,
+    )
+
+    for a, e in zip(actual, expected[200:]):
+        assert a["moving_average_50"] == e["moving_average_50"]
+        assert a["rsi"] == e["rsi"]
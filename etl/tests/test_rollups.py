@@ -0,0 +1,42 @@
+from datetime import date
+
+import pytest
+
+from etl.rollups import affected_periods, period_end, period_start
+
+
+@pytest.mark.parametrize(
+    "day, interval, start, end",
+    [
+        (date(2023, 10, 20), "week", date(2023, 10, 16), date(2023, 10, 23)),
+        (date(2023, 10, 16), "week", date(2023, 10, 16), date(2023, 10, 23)),
+        (date(2023, 12, 31), "week", date(2023, 12, 25), date(2024, 1, 1)),
+        (date(2023, 10, 20), "month", date(2023, 10, 1), date(2023, 11, 1)),
+        (date(2023, 12, 31), "month", date(2023, 12, 1), date(2024, 1, 1)),
+        (date(2024, 2, 29), "month", date(2024, 2, 1), date(2024, 3, 1)),
+    ],
+)
+def test_periods(day, interval, start, end):
+    assert period_start(day, interval) == start
+    assert period_end(start, interval) == end
+
+
+def test_affected_periods():
+    rows = [
+        ("AAPL", date(2023, 10, 19), 1.0),
+        ("AAPL", date(2023, 10, 20), 2.0),
+        ("AAPL", date(2023, 10, 23), 3.0),
+        ("MSFT", date(2023, 10, 20), 4.0),
+        ("MSFT", None, 5.0),
+    ]
+
+    assert affected_periods(rows, "week") == [
+        ("AAPL", date(2023, 10, 16), date(2023, 10, 23)),
+        ("AAPL", date(2023, 10, 23), date(2023, 10, 30)),
+        ("MSFT", date(2023, 10, 16), date(2023, 10, 23)),
+    ]
+    assert affected_periods(rows, "month") == [
+        ("AAPL", date(2023, 10, 1), date(2023, 11, 1)),
+        ("MSFT", date(2023, 10, 1), date(2023, 11, 1)),
+    ]
+
@@ -0,0 +1,76 @@
+from etl.rules import (
+    ADX,
+    Action,
+    evaluate,
+    adx_rule,
+    coppock_curve_rule,
+    macd_rule,
+    mfi_rule,
+    rsi_rule,
+    swing_low_rule,
+)
+from tests.test_vectorized import streaming, synthetic_bars
+
+
+def all_decisions(payload):
+    """Decisions of the rules as the monitor made them before `evaluate`."""
+    return [
+        macd_rule(
+            payload["symbol"], payload["close"], payload["macd"], payload["macd_signal"]
+        ),
+        adx_rule(
+            payload["symbol"],
+            payload["close"],
+            payload["pdi"],
+            payload["ndi"],
+            payload["adx"],
+        ),
+        rsi_rule(payload["symbol"], payload["close"], payload["rsi"]),
+        mfi_rule(
+            payload["symbol"],
+            current_price=payload["close"],
+            pct_change=payload["pct_change"],
+            mfi_value=payload["money_flow_index"],
+            mfi_delta=payload["mfi_delta"],
+        ),
+        swing_low_rule(
+            payload["symbol"],
+            current_price=payload["close"],
+            swing_low=payload["swing_low"],
+        ),
+        coppock_curve_rule(
+            payload["symbol"],
+            current_price=payload["close"],
+            coppock_curve=payload["coppock_curve"],
+        ),
+    ]
+
+
+def test_evaluate_materializes_the_actionable_decisions():
+    actionable = 0
+    for payload in streaming(list(synthetic_bars(600))):
+        expected = [d for d in all_decisions(payload) if d.action != Action.HOLD]
+        decisions = [signal.decision() for signal in evaluate(payload)]
+
+        assert decisions == expected
+        actionable += len(decisions)
+
+    assert actionable > 0
+
+
+def test_rules_are_shared():
+    decision = adx_rule("SYM", 10.0, 30.0, 20.0, 40.0)
+
+    assert decision.rule is ADX
+    assert decision.action == Action.BUY
+    assert decision.explanation == (
+        "Current price is 10.00, ADX = 40.0, +DI = 30.0, -DI = 20.0."
+    )
+
+
+def test_rules_missing_values_are_skipped():
+    payload = {"symbol": "SYM", "close": 10.0, "rsi": 20.0, "macd": None}
+
+    assert [(s.check.rule.name, s.action) for s in evaluate(payload)] == [
+        ("RSI", Action.BUY)
+    ]
@@ -0,0 +1,185 @@
+"""Plans of the frontend's queries and the tables written by the history sink.
+
+Needs a Postgres server, the tests are skipped unless `TEST_POSTGRES_URL`
+points to a database where they can create a temporary schema.
+"""
+import os
+import uuid
+from datetime import date, datetime, timedelta
+
+import psycopg
+import pytest
+from psycopg.conninfo import make_conninfo
+
+from etl.consumers import SQLSink
+from etl.registry import DEFAULT_INDICATORS, history_fields, parse_indicators
+
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+pytestmark = pytest.mark.skipif(
+    TEST_POSTGRES_URL is None, reason="TEST_POSTGRES_URL is not set"
+)
+
+SYMBOLS = [f"S{i:04d}" for i in range(500)]
+START = datetime(2022, 6, 1)
+DAYS = 250
+
+LATEST_BARS_QUERY = """
+    SELECT DISTINCT ON (symbol) symbol, date, close
+    FROM history
+    WHERE symbol IN ({symbols})
+    ORDER BY symbol, date DESC
+"""
+
+# Copy of the query of frontend.ideas.show_history, by interval.
+SHOW_HISTORY_QUERY = """
+    SELECT
+        symbol,
+        date,
+        open,
+        high,
+        low,
+        close,
+        volume,
+        pdi,ndi,adx,macd,macd_signal,rsi,dividends,moving_average_50,
+        moving_average_200,money_flow_index,swing_low,coppock_curve
+    FROM {table}
+    WHERE symbol = %(symbol)s AND {since}
+    ORDER BY date
+"""
+SHOW_HISTORY_QUERIES = {
+    "day": SHOW_HISTORY_QUERY.format(table="history", since="date > %(date)s"),
+    "week": SHOW_HISTORY_QUERY.format(
+        table="history_weekly",
+        since="date >= CAST(date_trunc(%(interval)s, %(date)s) AS date)",
+    ),
+    "month": SHOW_HISTORY_QUERY.format(
+        table="history_monthly",
+        since="date >= CAST(date_trunc(%(interval)s, %(date)s) AS date)",
+    ),
+}
+
+
+@pytest.fixture
+def schema():
+    name = f"test_{uuid.uuid4().hex}"
+    with psycopg.connect(TEST_POSTGRES_URL, autocommit=True) as connection:
+        connection.execute(f"CREATE SCHEMA {name}")
+        try:
+            yield make_conninfo(TEST_POSTGRES_URL, options=f"-csearch_path={name}")
+        finally:
+            connection.execute(f"DROP SCHEMA {name} CASCADE")
+
+
+def bars(symbol, start, features, days=range(DAYS)):
+    for i in days:
+        bar = {f: 100.0 + i for f in features}
+        bar.update(
+            symbol=symbol,
+            date=(start + timedelta(days=i)).isoformat(),
+            open=100.25 + i,
+            high=101.0 + i,
+            low=99.0 + i,
+            close=100.75 + i,
+            volume=1000.0 + i,
+        )
+        yield bar
+
+
+@pytest.fixture(
+    params=[(False, "real"), (True, "real"), (False, "double")],
+    ids=["plain", "partitioned", "double"],
+)
+def sink(request, schema):
+    partition_by_year, storage = request.param
+    features = history_fields(parse_indicators(DEFAULT_INDICATORS))
+    sink = SQLSink(
+        schema, 0, features, partition_by_year=partition_by_year, storage=storage
+    )
+    assert sink.partitioned == partition_by_year
+
+    sink.write_batch(
+        [(symbol, list(bars(symbol, START, features))) for symbol in SYMBOLS]
+    )
+    yield sink
+    sink.close()
+
+
+@pytest.fixture
+def history(sink):
+    with sink.pool.connection() as connection:
+        connection.execute("ANALYZE history")
+        connection.commit()
+        yield connection
+
+
+def explain(connection, query, params):
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN {query}", params)
+        return "\n".join(row[0] for row in cursor.fetchall())
+
+
+def assert_uses_index(plan):
+    assert "Seq Scan" not in plan, plan
+    assert "Index" in plan, plan
+
+
+def test_latest_bars_use_index(history):
+    symbols = SYMBOLS[:20]
+    query = LATEST_BARS_QUERY.format(symbols=", ".join(["%s"] * len(symbols)))
+    assert_uses_index(explain(history, query, symbols))
+
+
+def test_latest_features_are_the_latest_bars(history):
+    query = LATEST_BARS_QUERY.format(symbols=", ".join(["%s"] * len(SYMBOLS)))
+    with history.cursor() as cursor:
+        cursor.execute(query, SYMBOLS)
+        expected = cursor.fetchall()
+        cursor.execute(
+            "SELECT symbol, date, close FROM latest_features ORDER BY symbol"
+        )
+        assert cursor.fetchall() == expected
+
+
+@pytest.mark.parametrize("interval", list(SHOW_HISTORY_QUERIES))
+def test_show_history_uses_index(history, interval):
+    plan = explain(
+        history,
+        SHOW_HISTORY_QUERIES[interval],
+        {"symbol": "S0042", "date": date(2023, 1, 1), "interval": interval},
+    )
+    assert_uses_index(plan)
+
+
+def rollup(connection, table, symbol, day):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""SELECT open, high, low, close, volume FROM {table}
+            WHERE symbol = %s AND date = %s""",
+            (symbol, day),
+        )
+        return cursor.fetchone()
+
+
+@pytest.mark.parametrize(
+    "table, day, expected",
+    [
+        # Days 5..11 of the history.
+        ("history_weekly", date(2022, 6, 6), (105.25, 112.0, 104.0, 111.75, 7056)),
+        # Days 30..60 of the history.
+        ("history_monthly", date(2022, 7, 1), (130.25, 161.0, 129.0, 160.75, 32395)),
+    ],
+)
+def test_rollups_aggregate_the_bars_of_the_interval(history, table, day, expected):
+    assert rollup(history, table, "S0042", day) == expected
+
+
+def test_rewritten_bars_refresh_their_intervals(sink, history):
+    (bar,) = bars("S0042", START, sink.features, days=[11])
+    bar.update(high=600.0, close=500.0)
+    sink.write_batch([("S0042", [bar])])
+
+    weekly = rollup(history, "history_weekly", "S0042", date(2022, 6, 6))
+    assert weekly == (105.25, 600.0, 104.0, 500.0, 7056)
+    monthly = rollup(history, "history_monthly", "S0042", date(2022, 6, 1))
+    assert monthly == (100.25, 600.0, 99.0, 129.75, sum(range(1000, 1030)))
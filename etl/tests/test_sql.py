@@ -0,0 +1,238 @@
+import logging
+from datetime import date
+
+import psycopg
+import pytest
+
+from etl.consumers import feature_columns, history_rows, latest_rows
+from etl.cot_consumers import cot_history_rows
+from etl.sql import TableRows, to_date, unique_rows, write_rows, write_tables
+
+COLUMNS = [("symbol", "varchar"), ("date", "date"), ("close", "real")]
+
+
+@pytest.mark.parametrize(
+    "value",
+    ["2023-10-20T00:00:00-04:00", "2023-10-20", "10/20/2023", date(2023, 10, 20)],
+)
+def test_to_date(value):
+    assert to_date(value) == date(2023, 10, 20)
+
+
+def test_history_rows():
+    items = [
+        (
+            "AAPL",
+            [
+                {
+                    "symbol": "AAPL",
+                    "date": "2023-10-20T00:00:00-04:00",
+                    "close": 172.880005,
+                    "rsi": None,
+                }
+            ],
+        )
+    ]
+
+    assert history_rows(items, ["close", "rsi"]) == [
+        ("AAPL", date(2023, 10, 20), 172.88001, None)
+    ]
+
+
+def test_history_rows_of_double_storage_are_not_rounded():
+    items = [
+        (
+            "AAPL",
+            [
+                {
+                    "symbol": "AAPL",
+                    "date": "2023-10-20",
+                    "close": 172.880005,
+                    "volume": 58499100.0,
+                    "rsi": None,
+                }
+            ],
+        )
+    ]
+
+    rows = history_rows(items, ["close", "volume", "rsi"], storage="double")
+
+    assert rows == [("AAPL", date(2023, 10, 20), 172.880005, 58499100, None)]
+    assert isinstance(rows[0][3], int)
+
+
+@pytest.mark.parametrize("volume", [float("nan"), float("inf")])
+def test_history_rows_of_double_storage_without_volume(volume):
+    items = [("AAPL", [{"symbol": "AAPL", "date": "2023-10-20", "volume": volume}])]
+
+    rows = history_rows(items, ["volume"], storage="double")
+
+    assert rows == [("AAPL", date(2023, 10, 20), None)]
+
+
+def test_feature_columns():
+    assert feature_columns(["close", "volume"]) == [
+        ("close", "real"),
+        ("volume", "real"),
+    ]
+    assert feature_columns(["close", "volume"], "double") == [
+        ("close", "double precision"),
+        ("volume", "bigint"),
+    ]
+
+
+def test_cot_history_rows():
+    items = [
+        (
+            "1612",
+            [
+                {
+                    "market_and_exchange_names": "WTI",
+                    "cftc_commodity_code": "1612",
+                    "report_date": "2023-10-17",
+                    "open_interest_all": 1.0,
+                }
+            ],
+        )
+    ]
+
+    assert cot_history_rows(items, ["open_interest_all"]) == [
+        ("WTI", 1612, date(2023, 10, 17), 1.0)
+    ]
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, statement, params=None):
+        pass
+
+    def copy(self, statement):
+        raise self.connection.copy_error("COPY failed")
+
+    def executemany(self, statement, rows):
+        self.connection.statements.append(statement)
+        self.connection.inserted.extend(rows)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.inserted = []
+        self.statements = []
+        self.rolled_back = False
+        self.committed = False
+        self.copy_error = psycopg.errors.FeatureNotSupported
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rolled_back = True
+
+    def commit(self):
+        self.committed = True
+
+
+def test_failed_copy_falls_back_to_insert():
+    connection = FakeConnection()
+    rows = [("AAPL", date(2023, 10, 20), 1.0)]
+
+    write_rows(connection, "copy", "history", COLUMNS, rows, logging.getLogger("test"))
+
+    assert connection.rolled_back
+    assert connection.committed
+    assert connection.inserted == rows
+
+
+def test_lost_connection_does_not_fall_back_to_insert():
+    connection = FakeConnection()
+    connection.copy_error = psycopg.OperationalError
+    rows = [("AAPL", date(2023, 10, 20), 1.0)]
+
+    with pytest.raises(psycopg.OperationalError):
+        write_rows(
+            connection, "copy", "history", COLUMNS, rows, logging.getLogger("test")
+        )
+
+    assert connection.inserted == []
+
+
+def test_unique_rows_keeps_the_last_row_of_a_key():
+    rows = [
+        ("AAPL", date(2023, 10, 20), 1.0),
+        ("MSFT", date(2023, 10, 20), 2.0),
+        ("AAPL", date(2023, 10, 20), 3.0),
+    ]
+
+    assert unique_rows(COLUMNS, rows, ("symbol", "date")) == [
+        ("AAPL", date(2023, 10, 20), 3.0),
+        ("MSFT", date(2023, 10, 20), 2.0),
+    ]
+
+
+def test_rows_with_a_key_are_upserted():
+    connection = FakeConnection()
+    rows = [("AAPL", date(2023, 10, 20), 1.0), ("AAPL", date(2023, 10, 20), 2.0)]
+
+    write_rows(
+        connection,
+        "insert",
+        "history",
+        COLUMNS,
+        rows,
+        logging.getLogger("test"),
+        key=("symbol", "date"),
+    )
+
+    assert connection.inserted == rows[1:]
+    assert connection.statements[0].endswith(
+        "ON CONFLICT (symbol, date) DO UPDATE SET close = EXCLUDED.close"
+    )
+
+
+def test_latest_rows_keep_the_latest_bar_of_every_symbol():
+    rows = [
+        ("AAPL", date(2023, 10, 20), 1.0),
+        ("MSFT", date(2023, 10, 19), 2.0),
+        ("AAPL", date(2023, 10, 18), 3.0),
+        ("MSFT", date(2023, 10, 20), 4.0),
+    ]
+
+    assert latest_rows(rows) == [
+        ("AAPL", date(2023, 10, 20), 1.0),
+        ("MSFT", date(2023, 10, 20), 4.0),
+    ]
+
+
+def test_tables_are_written_in_one_transaction():
+    connection = FakeConnection()
+    rows = [("AAPL", date(2023, 10, 20), 1.0)]
+
+    write_tables(
+        connection,
+        "insert",
+        [
+            TableRows("history", COLUMNS, rows, ("symbol", "date")),
+            TableRows(
+                "latest_features",
+                COLUMNS,
+                rows,
+                ("symbol",),
+                where="latest_features.date <= EXCLUDED.date",
+            ),
+        ],
+        logging.getLogger("test"),
+    )
+
+    assert connection.inserted == rows + rows
+    assert connection.statements[1].startswith("INSERT INTO latest_features")
+    assert connection.statements[1].endswith(
+        "WHERE latest_features.date <= EXCLUDED.date"
+    )
@@ -0,0 +1,73 @@
+import copy
+from random import Random
+
+import pytest
+
+from etl.features import fused_indicators
+
+
+def synthetic_bars(bars: int = 1000):
+    rng = Random(0)
+    close = 100.0
+    for day in range(bars):
+        # Flat bars of an illiquid ticker leave ATR at zero for a while.
+        if day < 5:
+            yield {
+                "symbol": "SYM",
+                "date": day,
+                "open": close,
+                "high": close,
+                "low": close,
+                "close": close,
+                "volume": 0.0,
+            }
+            continue
+        close = max(1.0, close + rng.gauss(0.0, 1.0))
+        yield {
+            "symbol": "SYM",
+            "date": day,
+            "open": close,
+            "high": close + rng.random(),
+            "low": close - rng.random(),
+            "close": close,
+            "volume": float(rng.randrange(1_000, 100_000)),
+        }
+
+
+def streaming(events):
+    indicators = fused_indicators()
+    state = indicators.builder()
+    out = []
+    for event in copy.deepcopy(events):
+        state, event = indicators.mapper(state, event)
+        out.append(event)
+    return out
+
+
+@pytest.mark.parametrize(
+    "batches",
+    [
+        [1000],
+        # Vectorized after streaming, streaming after vectorized.
+        [10, 500, 3, 400, 87],
+        # Batches shorter than the windows of the indicators.
+        [64] * 15 + [40],
+    ],
+)
+def test_vectorized_matches_streaming(batches):
+    events = list(synthetic_bars())
+    expected = streaming(events)
+
+    indicators = fused_indicators()
+    state = indicators.builder()
+    actual = []
+    remaining = copy.deepcopy(events)
+    for size in batches:
+        batch, remaining = remaining[:size], remaining[size:]
+        state, batch = indicators.batch_mapper(state, batch)
+        actual.extend(batch)
+
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        assert a.keys() == e.keys()
+        assert a == pytest.approx(e, rel=1e-9, abs=1e-9)
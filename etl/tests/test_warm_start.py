@@ -0,0 +1,88 @@
+import copy
+from datetime import date, datetime, timedelta, timezone
+from random import Random
+
+import pytest
+from bytewax.dataflow import Dataflow
+from bytewax.testing import TestingInput, TestingOutput, run_main
+
+from etl.features import fused_indicators
+from etl.warm_start import load_snapshot, save_snapshot, seeds_from_rows
+
+
+def synthetic_events(bars: int = 1000):
+    rng = Random(0)
+    close = 100.0
+    started_at = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    for day in range(bars):
+        close = max(1.0, close + rng.gauss(0.0, 1.0))
+        yield {
+            "symbol": "SYM",
+            "date": started_at + timedelta(days=day),
+            "open": close,
+            "high": close + rng.random(),
+            "low": close - rng.random(),
+            "close": close,
+            "volume": float(rng.randrange(1_000, 100_000)),
+        }
+
+
+def calculate(indicators, events):
+    state = indicators.builder()
+    out = []
+    for event in copy.deepcopy(events):
+        state, event = indicators.mapper(state, event)
+        out.append(event)
+    return out
+
+
+def test_warm_start_resumes_after_the_seeded_bars(tmp_path):
+    events = list(synthetic_events())
+    expected = calculate(fused_indicators(), events)
+
+    fields = ["open", "high", "low", "close", "volume"]
+    rows = [
+        (e["symbol"], e["date"].date(), *(e[field] for field in fields))
+        for e in events[:800]
+    ]
+    seeds = seeds_from_rows(fused_indicators(), rows)
+    assert seeds["SYM"].seeded_until == date(2022, 3, 10)
+
+    save_snapshot(tmp_path / "seeds.pickle", seeds)
+    seeds = load_snapshot(tmp_path / "seeds.pickle")
+
+    # The whole topic is replayed, the seeded bars are skipped.
+    actual = calculate(fused_indicators(seeds), events)
+
+    assert actual[:800] == [None] * 800
+    for a, e in zip(actual[800:], expected[800:]):
+        assert a.pop("date") == e.pop("date")
+        assert a == pytest.approx(e, rel=1e-9, abs=1e-9)
+
+
+def test_recovered_seeded_state_without_seeds():
+    events = list(synthetic_events())
+    expected = calculate(fused_indicators(), events)
+
+    fields = ["open", "high", "low", "close", "volume"]
+    rows = [
+        (e["symbol"], e["date"].date(), *(e[field] for field in fields))
+        for e in events[:800]
+    ]
+    seeded = seeds_from_rows(fused_indicators(), rows)["SYM"]
+
+    # A restart without WARM_START, the recovery store still holds the state.
+    indicators = fused_indicators()
+    indicators.builder = lambda: copy.deepcopy(seeded)
+
+    flow = Dataflow()
+    flow.input("events", TestingInput([("SYM", e) for e in events[790:]]))
+    indicators(flow)
+    out = []
+    flow.output("out", TestingOutput(out))
+    run_main(flow)
+
+    assert len(out) == 200
+    for (_, a), e in zip(out, expected[800:]):
+        assert a.pop("date") == e.pop("date")
+        assert a == pytest.approx(e, rel=1e-9, abs=1e-9)
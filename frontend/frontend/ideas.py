@@ -11,6 +11,13 @@ from psycopg2.errors import UndefinedTable
 
 from frontend.utils import escape_markdown
 
+# Interval of the bars to their table.
+HISTORY_TABLES = {
+    "day": "history",
+    "week": "history_weekly",
+    "month": "history_monthly",
+}
+
 
 def parse_args():
     parser = ArgumentParser()
@@ -152,7 +159,7 @@ class ScoreServicer:
 
         df = self.conn.query(
             """SELECT 
-                DISTINCT ON (symbol) symbol, 
+                symbol, 
                 date, 
                 close, 
                 macd, 
@@ -166,9 +173,8 @@ class ScoreServicer:
                 moving_average_200,
                 money_flow_index,
                 coppock_curve
-               FROM history 
+               FROM latest_features 
                WHERE symbol IN :symbols 
-               ORDER BY symbol, date DESC
             """,
             params={"symbols": tuple(symbols.keys())},
             ttl=timedelta(minutes=1),
@@ -263,39 +269,34 @@ def show_history(connection: st.connections.SQLConnection, symbol: str):
         "swing_low",
         "coppock_curve",
     ]
-    avg_columns = ",".join([f"AVG({x}) AS {x}" for x in columns])
+    # The etl keeps weekly and monthly bars of the history.
+    table = HISTORY_TABLES[interval]
+    if interval == "day":
+        since = "date > :date"
+    else:
+        # The bars are dated by the first day of their interval, keep the one
+        # the period starts in.
+        since = "date >= CAST(date_trunc(:interval, :date) AS date)"
     df = connection.query(
         f"""
         SELECT
             symbol,
-            interval as date,
-            MAX(interval_open) AS open,
-            MAX(high) AS high,
-            MIN(low) AS low,
-            MAX(interval_close) AS close,
-            SUM(volume) AS volume,
-            {avg_columns}
-        FROM (
-            SELECT
-              FIRST_VALUE(open) OVER(PARTITION BY interval ORDER BY interval) AS interval_open,
-              LAST_VALUE(close) OVER(PARTITION BY interval ORDER BY interval) AS interval_close,
-              *
-            FROM (
-                SELECT 
-                    date_trunc(:interval, date) as interval,
-                    *
-                FROM history 
-                WHERE symbol = :symbol AND date > :date
-            )
-        )
-        GROUP BY symbol, interval
-        ORDER BY interval
+            date,
+            open,
+            high,
+            low,
+            close,
+            volume,
+            {",".join(columns)}
+        FROM {table}
+        WHERE symbol = :symbol AND {since}
+        ORDER BY date
         ;
         """,
         params={
-            "interval": interval,
             "symbol": symbol,
             "date": period,
+            "interval": interval,
         },
     )
 
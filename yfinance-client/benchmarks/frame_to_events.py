@@ -0,0 +1,70 @@
+"""Compares the row-wise and the columnar frame to events conversions.
+
+Usage:
+    python benchmarks/frame_to_events.py [--rows 50000]
+"""
+from argparse import ArgumentParser
+from timeit import repeat
+
+import numpy as np
+import pandas as pd
+
+from yfinance_client.downloader import TickerPrice, frame_to_events
+
+
+def iterrows_to_events(symbol: str, df: pd.DataFrame):
+    """The conversion used before the columnar one."""
+    for date, values in df.iterrows():
+        yield TickerPrice(
+            symbol=symbol,
+            date=date.to_pydatetime().isoformat(),
+            open=values["Open"],
+            high=values["High"],
+            low=values["Low"],
+            close=values["Close"],
+            volume=values["Volume"],
+            dividends=values["Dividends"],
+        )
+
+
+def synthetic_history(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    index = pd.date_range("1980-01-01", periods=rows, freq="B", tz="America/New_York")
+    close = 100.0 + rng.standard_normal(rows).cumsum()
+    return pd.DataFrame(
+        {
+            "Open": close + rng.standard_normal(rows),
+            "High": close + 1.0,
+            "Low": close - 1.0,
+            "Close": close,
+            "Volume": rng.integers(0, 10_000_000, rows),
+            "Dividends": 0.0,
+            "Stock Splits": 0.0,
+        },
+        index=index,
+    )
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    df = synthetic_history(args.rows)
+    assert list(iterrows_to_events("SYN", df)) == list(frame_to_events("SYN", df))
+
+    for name, convert in [
+        ("iterrows", iterrows_to_events),
+        ("columnar", frame_to_events),
+    ]:
+        best = min(
+            repeat(lambda: list(convert("SYN", df)), number=1, repeat=args.repeat)
+        )
+        print(
+            f"{name:>10}: {best * 1000:8.1f} ms, {args.rows / best:12,.0f} rows/sec"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from yfinance_client import downloader
+from yfinance_client.downloader import (
+    frame_to_events,
+    split_tickers_frame,
+    ticker_timezone,
+)
+
+COLUMNS = ["Open", "High", "Low", "Close", "Volume", "Dividends", "Stock Splits"]
+
+
+def history_frame(
+    n: int, start: str = "2023-01-02", tz: str = "America/New_York"
+) -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    index = pd.date_range(start, periods=n, freq="B", tz=tz)
+    data = rng.uniform(1.0, 100.0, size=(n, len(COLUMNS)))
+    return pd.DataFrame(data, index=index, columns=COLUMNS)
+
+
+def test_split_tickers_frame():
+    aaa = history_frame(5)
+    bbb = history_frame(5)
+    bbb.iloc[1] = np.nan
+    wide = pd.concat({"AAA": aaa, "BBB": bbb}, axis=1)
+
+    frames = dict(split_tickers_frame(["AAA", "BBB", "CCC"], wide))
+
+    assert list(frames) == ["AAA", "BBB"]
+    assert len(frames["AAA"]) == 5
+    assert len(frames["BBB"]) == 4
+    assert [e.symbol for e in frame_to_events("BBB", frames["BBB"])] == ["BBB"] * 4
+
+
+def test_split_tickers_frame_restores_timezones():
+    aaa = history_frame(5, start="2023-10-16")
+    bbb = history_frame(5, start="2023-10-16", tz="Europe/Berlin")
+    # yfinance.download moves all the tickers of a chunk to one timezone.
+    wide = pd.concat({"AAA": aaa, "BBB": bbb.tz_convert("America/New_York")}, axis=1)
+    timezones = {"AAA": "America/New_York", "BBB": "Europe/Berlin"}
+
+    frames = dict(split_tickers_frame(["AAA", "BBB"], wide, timezones))
+
+    for symbol, frame in [("AAA", aaa), ("BBB", bbb)]:
+        events = list(frame_to_events(symbol, frames[symbol]))
+        assert events == list(frame_to_events(symbol, frame))
+    assert frames["BBB"].index[1].isoformat() == "2023-10-17T00:00:00+02:00"
+
+
+class FakeLimiter:
+    def __init__(self):
+        self.acquired = 0
+
+    def acquire(self, n: int = 1):
+        self.acquired += n
+
+
+def test_ticker_timezone(monkeypatch):
+    cache = {"AAA": "America/New_York"}
+    monkeypatch.setattr(
+        downloader, "get_tz_cache", lambda: SimpleNamespace(lookup=cache.get)
+    )
+    monkeypatch.setattr(
+        downloader,
+        "Ticker",
+        lambda symbol: SimpleNamespace(fast_info=SimpleNamespace(timezone="UTC")),
+    )
+    limiter = FakeLimiter()
+
+    assert ticker_timezone("AAA", limiter) == "America/New_York"
+    assert limiter.acquired == 0
+    # Not cached, Yahoo is asked within the limit.
+    assert ticker_timezone("BTC-USD", limiter) == "UTC"
+    assert limiter.acquired == 1
+
+
+def test_split_single_ticker_frame():
+    frames = dict(split_tickers_frame(["AAA"], history_frame(3)))
+
+    assert list(frames) == ["AAA"]
+
+
+def test_frame_to_events_matches_iterrows():
+    df = history_frame(600, start="2022-01-03")
+    df["Volume"] = np.arange(len(df))
+
+    expected = [
+        (
+            "AAA",
+            date.to_pydatetime().isoformat(),
+            values["Open"],
+            values["High"],
+            values["Low"],
+            values["Close"],
+            values["Volume"],
+            values["Dividends"],
+            "TICKER_PRICE",
+        )
+        for date, values in df.iterrows()
+    ]
+
+    assert [tuple(e) for e in frame_to_events("AAA", df)] == expected
+    assert list(frame_to_events("AAA", df.iloc[:0])) == []
@@ -0,0 +1,25 @@
+import random
+import time
+
+from yfinance_client.engine import RateLimiter, fetch_in_order
+
+
+def test_fetch_in_order_keeps_tasks_order():
+    def fetch(task):
+        time.sleep(random.uniform(0.0, 0.01))
+        return [task] * task
+
+    tasks = list(range(20))
+    out = list(fetch_in_order(fetch, tasks, concurrency=4))
+
+    assert [task for task, _ in out] == tasks
+    assert all(events == [task] * task for task, events in out)
+
+
+def test_rate_limiter_spaces_requests():
+    limiter = RateLimiter(rate=100.0)
+    start = time.monotonic()
+    for _ in range(11):
+        limiter.acquire()
+
+    assert time.monotonic() - start >= 0.09
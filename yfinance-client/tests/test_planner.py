@@ -0,0 +1,56 @@
+from datetime import date, datetime
+
+from yfinance_client.planner import FetchPlan, plan_fetches, update_watermarks
+
+TODAY = date(2023, 10, 20)
+
+
+def test_plan_fetches():
+    db = {
+        "AAA": {"last_update": "2023-10-19T04:00:00", "last_date": "2023-10-18"},
+        "BBB": {"last_update": "2023-10-19T04:00:00", "last_date": "2023-10-18"},
+        "CCC": {"last_update": "2023-10-19T04:00:00", "last_date": "2023-10-19"},
+        "DDD": {"last_update": "2023-10-12T04:00:00"},
+    }
+
+    plans = list(
+        plan_fetches(["AAA", "NEW", "BBB", "CCC", "DDD", "AAA"], db, TODAY, 10)
+    )
+
+    assert plans == [
+        FetchPlan(symbols=["NEW"], end=TODAY),
+        FetchPlan(symbols=["AAA", "BBB"], start=date(2023, 10, 19), end=TODAY),
+        FetchPlan(symbols=["DDD"], start=date(2023, 10, 12), end=TODAY),
+    ]
+
+
+def test_plan_fetches_splits_batches():
+    db = {s: {"last_date": "2023-10-18"} for s in "ABCDE"}
+
+    plans = list(plan_fetches("ABCDE", db, TODAY, batch_size=2))
+
+    assert [plan.symbols for plan in plans] == [["A", "B"], ["C", "D"], ["E"]]
+
+
+def test_plan_fetches_excludes_todays_bar_from_whole_history():
+    (plan,) = plan_fetches(["NEW"], {}, TODAY)
+
+    assert plan.start is None
+    assert plan.end == TODAY
+
+
+def test_update_watermarks():
+    db = {"AAA": {"last_date": "2023-10-18"}, "BBB": {"last_date": "2023-10-18"}}
+    now = datetime(2023, 10, 20, 4)
+
+    update_watermarks(db, ["AAA", "BBB", "NEW"], {"AAA": "2023-10-19"}, now)
+
+    assert db == {
+        "AAA": {"last_update": "2023-10-20T04:00:00", "last_date": "2023-10-19"},
+        "BBB": {"last_date": "2023-10-18"},
+        "NEW": {"last_update": "2023-10-20T04:00:00"},
+    }
+    # The ticker without bars is fetched from the day of the run.
+    assert list(plan_fetches(["NEW"], db, date(2023, 10, 21))) == [
+        FetchPlan(symbols=["NEW"], start=date(2023, 10, 20), end=date(2023, 10, 21))
+    ]
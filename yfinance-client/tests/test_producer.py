@@ -0,0 +1,45 @@
+import logging
+
+from yfinance_client.producer import EventProducer
+
+
+class FakeFuture:
+    def __init__(self, error=None):
+        self.error = error
+
+    def add_errback(self, errback):
+        if self.error is not None:
+            errback(self.error)
+
+
+class FakeKafkaProducer:
+    def __init__(self):
+        self.sent = []
+        self.flushed = False
+
+    def send(self, topic, value, key=None):
+        self.sent.append((topic, key, value))
+        return FakeFuture(error=ValueError("boom") if value["i"] == 1 else None)
+
+    def flush(self, timeout=None):
+        self.flushed = True
+
+
+def test_event_producer_counts_deliveries():
+    kafka_producer = FakeKafkaProducer()
+    producer = EventProducer(
+        kafka_producer, topic="events", logger=logging.getLogger(__name__)
+    )
+
+    for i in range(3):
+        producer.send({"i": i}, key="AAPL" if i != 1 else "MSFT")
+    producer.flush()
+
+    assert kafka_producer.flushed
+    assert [(topic, key) for topic, key, _ in kafka_producer.sent] == [
+        ("events", b"AAPL"),
+        ("events", b"MSFT"),
+        ("events", b"AAPL"),
+    ]
+    assert (producer.sent, producer.failed) == (3, 1)
+    assert producer.failed_keys == {"MSFT"}
@@ -1,14 +1,20 @@
 import json
 import logging
 from argparse import ArgumentParser
-from datetime import datetime
+from datetime import date, datetime
 from pathlib import Path
 
 
 from rich.logging import RichHandler
 from rich import progress
 
-from yfinance_client.downloader import get_ticker_events, get_ticker_history_events
+from yfinance_client.downloader import (
+    get_ticker_history_events,
+    get_tickers_history_events,
+)
+from yfinance_client.engine import RateLimiter, fetch_in_order
+from yfinance_client.planner import plan_fetches, update_watermarks
+from yfinance_client.producer import add_producer_arguments, create_producer
 
 
 def stocks():
@@ -46,12 +52,31 @@ def parse_args():
         help="Specify the kafka topic stream to.",
         default="events",
     )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        help="Specify the number of tickers downloaded in parallel.",
+        default=8,
+    )
+    parser.add_argument(
+        "--requests_per_second",
+        type=float,
+        help="Specify the max number of requests to Yahoo per second (0 disables the limit).",
+        default=4.0,
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        help="Specify the number of known tickers with the same missing range "
+        "updated with one download call.",
+        default=50,
+    )
+    add_producer_arguments(parser)
 
     return parser.parse_args()
 
 
 def main():
-    from kafka import KafkaProducer
     from kafka.admin import KafkaAdminClient, NewTopic
 
     logger = logging.getLogger("yfinance-client-cli")
@@ -68,31 +93,48 @@ def main():
     for topic in topics:
         if topic not in existing_topics:
             admin_client.create_topics(
-                [NewTopic(topic, num_partitions=1, replication_factor=1)]
+                [
+                    NewTopic(
+                        topic,
+                        num_partitions=args.kafka_partitions,
+                        replication_factor=1,
+                    )
+                ]
             )
 
     if args.storage.exists():
         db = json.loads(args.storage.read_text())
     else:
         db = {}
+    # Watermarks of the last run, kept for the symbols with undelivered events.
+    stored = dict(db)
 
-    producer = KafkaProducer(
-        bootstrap_servers=args.kafka_bootstrap_servers,
-        value_serializer=lambda m: json.dumps(m).encode("utf8"),
-    )
+    producer = create_producer(args, logger)
 
-    def on_success(metadata):
-        logger.info(
-            f"Message produced to topic '{metadata.topic}'  at offset {metadata.offset}"
+    def fetch(plan):
+        if plan.start is None:
+            return get_ticker_history_events(
+                symbol=plan.symbols[0], period="max", end=plan.end
+            )
+        if len(plan.symbols) == 1:
+            return get_ticker_history_events(
+                symbol=plan.symbols[0], start=plan.start, end=plan.end
+            )
+        return get_tickers_history_events(
+            symbols=plan.symbols,
+            chunk_size=len(plan.symbols),
+            start=plan.start,
+            end=plan.end,
+            limiter=limiter,
         )
 
-    def on_error(e):
-        logger.error(f"Error sending message: {e}")
-
-    def send_event(event):
-        future = producer.send(args.kafka_topic, value=event._asdict())
-        future.add_callback(on_success)
-        future.add_errback(on_error)
+    limiter = RateLimiter(args.requests_per_second)
+    plans = plan_fetches(
+        (stock.ticker_name for stock in stocks()),
+        db,
+        today=date.today(),
+        batch_size=args.batch_size,
+    )
 
     with progress.Progress(
         "[progress.description]{task.description}",
@@ -102,33 +144,45 @@ def main():
         progress.TimeElapsedColumn(),
         refresh_per_second=1,  # bit slower updates
     ) as pgs:
-        
-        
         process_stocks_task = pgs.add_task("[green]Processing stocks:", total=None)
-        for stock in stocks():
+        for plan, events in fetch_in_order(
+            fetch,
+            plans,
+            concurrency=args.concurrency,
+            limiter=limiter,
+            weight=lambda plan: len(plan.symbols),
+        ):
             process_events_task = pgs.add_task(
-                f"Processing {stock.ticker_name}", total=None
+                f"Processing {', '.join(plan.symbols)}", total=len(events)
             )
 
-            if stock.ticker_name not in db:
-                events = get_ticker_history_events(
-                    symbol=stock.ticker_name, period="max"
-                )
-            else:
-                events = get_ticker_events(symbol=stock.ticker_name)
-
+            last_dates = {}
             for event in events:
-                send_event(event)
+                producer.send(event._asdict(), key=event.symbol)
+                last_dates[event.symbol] = max(
+                    event.date[:10], last_dates.get(event.symbol, "")
+                )
                 pgs.advance(process_events_task)
             pgs.update(process_events_task, visible=False)
 
-            db[stock.ticker_name] = {"last_update": datetime.today().isoformat()}
-            pgs.advance(process_stocks_task)
+            update_watermarks(db, plan.symbols, last_dates, now=datetime.today())
+            pgs.advance(process_stocks_task, len(plan.symbols))
+
+    # Flush before persisting the watermarks, so they never run ahead of the broker.
+    producer.close()
+
+    # The undelivered bars are fetched again by the next run.
+    for symbol in producer.failed_keys:
+        if symbol in stored:
+            db[symbol] = stored[symbol]
+        else:
+            db.pop(symbol, None)
 
     args.storage.write_text(json.dumps(db))
     logger.info(f"Dump info about processed tickers to {args.storage}")
 
 
 if __name__ == "__main__":
-    logging.basicConfig(handlers=[RichHandler()], level=logging.ERROR)
+    logging.basicConfig(handlers=[RichHandler()], level=logging.INFO)
+    logging.getLogger("kafka").setLevel(logging.WARNING)
     main()
@@ -0,0 +1,164 @@
+"""Encoding of the messages flowing through the pipeline.
+
+Two encodings are supported:
+
+* `json` - the original UTF-8 JSON documents.
+* `binary` - a magic byte, the schema id and a msgpack array holding the
+  values of the schema's fields in order followed by a map of the fields
+  the schema doesn't know about. Field names aren't repeated in every
+  message.
+
+Schemas are selected by the payload's `kind`. The richest schema whose
+fields are all present in the payload is used, payloads matching none are
+stored as a plain msgpack map (schema 0). Schema ids are never reused:
+changing the fields of a schema means adding a new id, so old messages
+stay readable.
+
+`decode` accepts both encodings, so readers can be switched before writers.
+
+This module is the source of the producers' copies,
+yfinance-client/yfinance_client/codec.py and cot-client/cot_client/codec.py,
+their images are built without the etl package. `make sync-codec` refreshes
+them, tests/test_codec.py fails when they diverge.
+"""
+import json
+from typing import Any, Dict, Mapping, Sequence
+
+import msgpack
+
+MAGIC = 0xC1  # Never used by msgpack and never starts a JSON document.
+MAP_SCHEMA_ID = 0
+ENCODINGS = ["json", "binary"]
+
+TICKER_PRICE_FIELDS = (
+    "symbol",
+    "date",
+    "open",
+    "high",
+    "low",
+    "close",
+    "volume",
+    "dividends",
+)
+
+SCHEMAS: Mapping[int, Sequence[str]] = {
+    1: TICKER_PRICE_FIELDS,
+    2: TICKER_PRICE_FIELDS
+    + (
+        "tr",
+        "atr",
+        "apdm",
+        "andm",
+        "pdi",
+        "ndi",
+        "adx",
+        "close_ma_12",
+        "close_ma_26",
+        "macd",
+        "macd_signal",
+        "pct_change",
+        "gain_ma",
+        "loss_ma",
+        "rsi",
+        "moving_average_50",
+        "moving_average_200",
+        "money_flow_index",
+        "mfi_delta",
+        "swing_low",
+        "coppock_curve",
+    ),
+    3: (
+        "market_and_exchange_names",
+        "cftc_commodity_code",
+        "report_date",
+        "open_interest_all",
+        "prod_merc_positions_long_all",
+        "prod_merc_positions_short_all",
+        "swap_positions_long_all",
+        "swap_positions_short_all",
+        "m_money_positions_long_all",
+        "m_money_positions_short_all",
+        "other_rept_positions_long_all",
+        "other_rept_positions_short_all",
+        "nonrept_positions_long_all",
+        "nonrept_positions_short_all",
+    ),
+}
+
+# Kind of the payload to its schemas, the richest first.
+KIND_SCHEMAS: Mapping[str, Sequence[int]] = {
+    "TICKER_PRICE": (2, 1),
+    "COMMITMENT_OF_TRADERS": (3,),
+}
+
+SCHEMA_KINDS = {
+    schema_id: kind
+    for kind, schema_ids in KIND_SCHEMAS.items()
+    for schema_id in schema_ids
+}
+
+
+def _default(obj: Any) -> Any:
+    # NumPy scalars coming from pandas frames.
+    if hasattr(obj, "item"):
+        return obj.item()
+    raise TypeError(f"Can not serialize {obj!r}")
+
+
+def _select_schema(payload: Mapping[str, Any]) -> int:
+    for schema_id in KIND_SCHEMAS.get(payload.get("kind"), ()):
+        if all(field in payload for field in SCHEMAS[schema_id]):
+            return schema_id
+    return MAP_SCHEMA_ID
+
+
+def encode_binary(payload: Mapping[str, Any]) -> bytes:
+    schema_id = _select_schema(payload)
+    if schema_id == MAP_SCHEMA_ID:
+        body = payload
+    else:
+        fields = SCHEMAS[schema_id]
+        body = [payload[field] for field in fields]
+        body.append(
+            {
+                k: v
+                for k, v in payload.items()
+                if k != "kind" and k not in fields
+            }
+        )
+
+    return bytes((MAGIC, schema_id)) + msgpack.packb(body, default=_default)
+
+
+def decode_binary(data: bytes) -> Dict[str, Any]:
+    schema_id = data[1]
+    body = msgpack.unpackb(data[2:])
+    if schema_id == MAP_SCHEMA_ID:
+        return body
+
+    if schema_id not in SCHEMAS:
+        raise ValueError(f"Unknown schema {schema_id}")
+
+    *values, extras = body
+    payload = dict(zip(SCHEMAS[schema_id], values))
+    payload.update(extras)
+    payload["kind"] = SCHEMA_KINDS[schema_id]
+    return payload
+
+
+def encode(payload: Mapping[str, Any], encoding: str = "binary") -> bytes:
+    """Encodes the payload with the given encoding."""
+    match encoding:
+        case "json":
+            return json.dumps(payload, default=_default).encode("utf-8")
+        case "binary":
+            return encode_binary(payload)
+        case _:
+            raise ValueError(f"Unknown encoding {encoding}")
+
+
+def decode(data: bytes | str) -> Dict[str, Any]:
+    """Decodes the message written with any of the encodings."""
+    if isinstance(data, (bytes, bytearray)) and data[:1] == bytes((MAGIC,)):
+        return decode_binary(data)
+    return json.loads(data)
@@ -1,5 +1,13 @@
-from yfinance import Ticker
-from typing import NamedTuple
+from datetime import date, datetime, timedelta, timezone
+from itertools import repeat
+from yfinance import Ticker, download
+from yfinance.cache import get_tz_cache
+from typing import Iterator, Mapping, NamedTuple, Sequence
+
+import numpy as np
+import pandas as pd
+
+from yfinance_client.engine import RateLimiter
 
 
 class TickerPrice(NamedTuple):
@@ -28,25 +36,182 @@ def get_ticker_events(symbol: str):
     yield from get_ticker_history_events(symbol=symbol, period="1d")
 
 
-def get_ticker_history_events(symbol: str, period: str = "max"):
+def get_ticker_history_events(
+    symbol: str,
+    period: str = "max",
+    start: date | None = None,
+    end: date | None = None,
+):
     """Returns events of the ticker.
 
     Args:
         symbol - the ticker's symbol
+        period - the period of the history, ignored when `start` is given
+        start - the first day of the history
+        end - the day after the last day of the history
 
     Returns:
         events.
     """
     ticker = Ticker(symbol)
 
-    for date, values in ticker.history(period=period, interval="1d").iterrows():
-        yield TickerPrice(
-            symbol=symbol,
-            date=date.to_pydatetime().isoformat(),
-            open=values["Open"],
-            high=values["High"],
-            low=values["Low"],
-            close=values["Close"],
-            volume=values["Volume"],
-            dividends=values["Dividends"],
+    if start is not None:
+        history = ticker.history(start=start, end=end, interval="1d")
+    else:
+        history = ticker.history(period=period, end=end, interval="1d")
+
+    yield from frame_to_events(symbol, history)
+
+
+def get_tickers_history_events(
+    symbols: Sequence[str],
+    period: str = "1d",
+    chunk_size: int = 50,
+    start: date | None = None,
+    end: date | None = None,
+    limiter: RateLimiter | None = None,
+):
+    """Returns events of many tickers downloaded in chunks.
+
+    Every chunk is downloaded with a single `yfinance.download` call and the
+    wide frame is split back into the events of every ticker. The events are
+    yielded ticker by ticker in the order of `symbols`.
+
+    `yfinance.download` moves the bars of all the tickers of a chunk to one
+    timezone, so every ticker's bars are converted back to its exchange's
+    timezone, as `get_ticker_history_events` returns them.
+
+    Args:
+        symbols - the tickers' symbols
+        period - the period of the history, ignored when `start` is given
+        chunk_size - the max number of tickers downloaded at once
+        start - the first day of the history
+        end - the day after the last day of the history
+        limiter - the rate limiter charged for the timezones' lookups, if any
+
+    Returns:
+        events.
+    """
+    if start is not None:
+        history_range = {"start": start, "end": end}
+    else:
+        history_range = {"period": period}
+
+    for offset in range(0, len(symbols), chunk_size):
+        chunk = list(symbols[offset : offset + chunk_size])
+        df = download(
+            chunk,
+            **history_range,
+            interval="1d",
+            group_by="ticker",
+            actions=True,
+            auto_adjust=True,
+            ignore_tz=False,
+            threads=False,
+            progress=False,
         )
+        timezones = {symbol: ticker_timezone(symbol, limiter) for symbol in chunk}
+        for symbol, frame in split_tickers_frame(chunk, df, timezones):
+            yield from frame_to_events(symbol, frame)
+
+
+def ticker_timezone(symbol: str, limiter: RateLimiter | None = None) -> str | None:
+    """Returns the name of the timezone of the ticker's exchange, if known.
+
+    The download stores the timezones of the tickers in yfinance's cache, so
+    Yahoo is asked only when the cache is disabled.
+
+    Args:
+        symbol - the ticker's symbol
+        limiter - the rate limiter charged for a request to Yahoo
+    """
+    tz = get_tz_cache().lookup(symbol)
+    if tz is not None:
+        return tz
+
+    if limiter is not None:
+        limiter.acquire()
+    try:
+        return Ticker(symbol).fast_info.timezone
+    except Exception:
+        return None
+
+
+def split_tickers_frame(
+    symbols: Sequence[str],
+    df: pd.DataFrame,
+    timezones: Mapping[str, str | None] | None = None,
+) -> Iterator[tuple[str, pd.DataFrame]]:
+    """Splits the frame returned by `yfinance.download` per ticker.
+
+    Rows where the ticker has no prices (e.g. another exchange was open that
+    day) are dropped.
+
+    Args:
+        symbols - the tickers' symbols
+        df - the frame returned by `yfinance.download`
+        timezones - the timezones of the tickers' exchanges, the index of
+            every ticker's frame is converted to its timezone
+    """
+    timezones = timezones or {}
+    if not isinstance(df.columns, pd.MultiIndex):
+        # yfinance flattens the columns when only one ticker is requested.
+        frames = {symbols[0]: df} if len(symbols) == 1 else {}
+    else:
+        frames = {
+            symbol: df[symbol]
+            for symbol in symbols
+            if symbol in df.columns.get_level_values(0)
+        }
+
+    for symbol in symbols:
+        if symbol not in frames:
+            continue
+        frame = frames[symbol].dropna(
+            subset=["Open", "High", "Low", "Close"], how="all"
+        )
+        tz = timezones.get(symbol)
+        if tz is not None and frame.index.tz is not None:
+            frame = frame.tz_convert(tz)
+        if not frame.empty:
+            yield symbol, frame
+
+
+def frame_to_events(symbol: str, df: pd.DataFrame):
+    """Converts the history frame of the ticker to events.
+
+    The frame is converted column by column, iterating rows only to
+    build the resulting tuples.
+    """
+    if df.empty:
+        return
+
+    columns = [
+        df[column].to_numpy(dtype=float).tolist()
+        for column in ["Open", "High", "Low", "Close", "Volume", "Dividends"]
+    ]
+    yield from map(TickerPrice, repeat(symbol), isoformat_index(df.index), *columns)
+
+
+def isoformat_index(index: pd.DatetimeIndex) -> list[str]:
+    """Formats the index as `date.to_pydatetime().isoformat()` would do."""
+    local = index.tz_localize(None) if index.tz is not None else index
+    if (local.asi8 % 1_000_000_000 != 0).any():
+        # Sub-second timestamps never happen for daily bars, keep the slow path exact.
+        return [date.isoformat() for date in index.to_pydatetime()]
+
+    dates = np.datetime_as_string(local.to_numpy(), unit="s")
+    if index.tz is None:
+        return dates.tolist()
+
+    offsets = (local.asi8 - index.asi8) // 1_000_000_000
+    unique_offsets, inverse = np.unique(offsets, return_inverse=True)
+    suffixes = np.array(
+        [
+            datetime(2000, 1, 1, tzinfo=timezone(timedelta(seconds=int(offset))))
+            .isoformat()
+            .removeprefix("2000-01-01T00:00:00")
+            for offset in unique_offsets
+        ]
+    )
+    return np.char.add(dates, suffixes[inverse]).tolist()
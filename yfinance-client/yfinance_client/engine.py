@@ -0,0 +1,80 @@
+"""Bounded-concurrency fetch engine."""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from time import monotonic, sleep
+from typing import Callable, Iterable, Iterator, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class RateLimiter:
+    """Spaces out acquisitions so at most `rate` happen per second.
+
+    The limiter is shared between worker threads, so the whole engine
+    stays under the limit regardless of the number of workers.
+    """
+
+    def __init__(self, rate: float):
+        """Constructor.
+
+        Args:
+          rate - max number of acquisitions per second, non positive disables the limit.
+        """
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = Lock()
+        self._next_slot = monotonic()
+
+    def acquire(self, n: int = 1):
+        """Blocks until the caller is allowed to issue the next `n` requests."""
+        with self._lock:
+            now = monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + n * self.interval
+
+        if wait > 0:
+            sleep(wait)
+
+
+def fetch_in_order(
+    fetch: Callable[[T], Iterable[R]],
+    tasks: Iterable[T],
+    concurrency: int,
+    limiter: RateLimiter | None = None,
+    weight: Callable[[T], int] | None = None,
+) -> Iterator[Tuple[T, Sequence[R]]]:
+    """Runs `fetch` for every task in a thread pool.
+
+    Results are yielded in the order of `tasks`, so the caller sees the same
+    stream as with a plain loop. At most `2 * concurrency` tasks are in flight,
+    which bounds the memory used by results waiting to be consumed.
+
+    Args:
+        fetch - the function downloading the data of a task
+        tasks - the tasks to process
+        concurrency - the number of worker threads
+        limiter - optional rate limiter shared by the workers
+        weight - optional number of requests issued by a task, 1 by default
+
+    Returns:
+        pairs of the task and its materialized results.
+    """
+
+    def run(task: T) -> Sequence[R]:
+        if limiter is not None:
+            limiter.acquire(weight(task) if weight is not None else 1)
+        return list(fetch(task))
+
+    window = 2 * max(concurrency, 1)
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+        pending = deque()
+        for task in tasks:
+            pending.append((task, executor.submit(run, task)))
+            if len(pending) >= window:
+                head, future = pending.popleft()
+                yield head, future.result()
+
+        while pending:
+            head, future = pending.popleft()
+            yield head, future.result()
@@ -0,0 +1,110 @@
+"""Plans which ranges of the tickers' history have to be downloaded."""
+from datetime import date, datetime, timedelta
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    Mapping,
+    MutableMapping,
+    NamedTuple,
+    Sequence,
+)
+
+
+class FetchPlan(NamedTuple):
+    symbols: Sequence[str]
+    # None means the whole history, otherwise the first missing day.
+    start: date | None = None
+    # Exclusive end of the range.
+    end: date | None = None
+
+
+def watermark(entry: Mapping[str, Any]) -> date | None:
+    """Returns the date of the last emitted bar stored in the storage entry.
+
+    Entries written before watermarks existed only have `last_update`, the
+    time of the run. Such a run emitted the bar of the previous day. So do
+    the entries of new tickers without any bar, they start from that day.
+    """
+    if "last_date" in entry:
+        return date.fromisoformat(entry["last_date"])
+    if "last_update" in entry:
+        return datetime.fromisoformat(entry["last_update"]).date() - timedelta(days=1)
+    return None
+
+
+def plan_fetches(
+    symbols: Iterable[str],
+    db: Mapping[str, Mapping[str, Any]],
+    today: date,
+    batch_size: int = 1,
+) -> Iterator[FetchPlan]:
+    """Plans downloads of exactly the missing bars.
+
+    Unknown tickers get their whole history alone. Known tickers are
+    requested from the day after their watermark. Both end yesterday (today's
+    bar isn't complete yet), tickers sharing the same range are batched
+    together. Up to date tickers are skipped.
+
+    Args:
+        symbols - the tickers' symbols, repeated ones are planned once
+        db - the storage with the watermarks
+        today - the date of the run
+        batch_size - the max number of tickers in one plan
+
+    Returns:
+        plans in a deterministic order.
+    """
+    seen = set()
+    batches = {}
+    for symbol in symbols:
+        if symbol in seen:
+            continue
+        seen.add(symbol)
+
+        last_date = watermark(db.get(symbol, {}))
+        if last_date is None:
+            yield FetchPlan(symbols=[symbol], end=today)
+            continue
+
+        start = last_date + timedelta(days=1)
+        if start >= today:
+            continue
+
+        batch = batches.setdefault(start, [])
+        batch.append(symbol)
+        if len(batch) >= batch_size:
+            yield FetchPlan(symbols=batch, start=start, end=today)
+            del batches[start]
+
+    for start, batch in batches.items():
+        yield FetchPlan(symbols=batch, start=start, end=today)
+
+
+def update_watermarks(
+    db: MutableMapping[str, Dict[str, Any]],
+    symbols: Sequence[str],
+    last_dates: Mapping[str, str],
+    now: datetime,
+):
+    """Stores the watermarks of the planned symbols after their fetch.
+
+    Without new bars the watermark stays, so the range is retried next run.
+    Unknown tickers without any bar (delisted, not trading yet) are stored
+    anyway, so their whole history isn't downloaded again every run.
+
+    Args:
+        db - the storage with the watermarks
+        symbols - the symbols of the plan
+        last_dates - the dates of the last emitted bars of the symbols
+        now - the time of the run
+    """
+    for symbol in symbols:
+        if symbol in last_dates:
+            db[symbol] = {
+                "last_update": now.isoformat(),
+                "last_date": last_dates[symbol],
+            }
+        elif symbol not in db:
+            db[symbol] = {"last_update": now.isoformat()}